@@ -147,7 +147,7 @@ async def _create_elasticsearch_service():
         })
         
         try:
-            es_service = ElasticsearchService(settings.elasticsearch_url, settings.elasticsearch_api_key)
+            es_service = await ElasticsearchService.get_instance(settings.elasticsearch_url, settings.elasticsearch_api_key)
             
             # Test connectivity (basic ping)
             logger.debug("🔍 Testing Elasticsearch connectivity...")
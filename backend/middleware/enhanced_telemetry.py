@@ -63,6 +63,11 @@ except ImportError:
             SERVICE_VERSION = "service.version"
             DEPLOYMENT_ENVIRONMENT = "deployment.environment"
 
+def _tracing_configured() -> bool:
+    """Whether an SDK tracer provider has been installed; until then spans are never recorded."""
+    return not isinstance(trace.get_tracer_provider(), trace.ProxyTracerProvider)
+
+
 class SecurityAwareTracer:
     """Enhanced tracer with automatic data sanitization and security controls.
 
@@ -86,12 +91,14 @@ class SecurityAwareTracer:
                               attributes: Optional[Dict[str, Any]] = None,
                               **kwargs):
         """Start a span as current span with automatic attribute sanitization."""
+        if self._provided_tracer is None and not _tracing_configured():
+            # Nothing would be recorded, so skip span creation and attribute sanitization
+            yield trace.INVALID_SPAN
+            return
         tracer = self._provided_tracer or trace.get_tracer(self._name, self._version)
-        try:
-            provider = trace.get_tracer_provider()
-            logger.debug(f"SecurityAwareTracer: using tracer provider {provider.__class__.__name__} for tracer {self._name}")
-        except Exception:
-            logger.debug(f"SecurityAwareTracer: could not determine tracer provider for tracer {self._name}")
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug("SecurityAwareTracer: using tracer provider %s for tracer %s",
+                         trace.get_tracer_provider().__class__.__name__, self._name)
         with tracer.start_as_current_span(name, kind=kind, **kwargs) as span:
             if attributes:
                 sanitized_attrs = self.sanitizer.sanitize_attributes(attributes)
@@ -138,12 +145,14 @@ class SecurityAwareTracer:
                    attributes: Optional[Dict[str, Any]] = None,
                    **kwargs):
         """Start a span with automatic attribute sanitization."""
+        if self._provided_tracer is None and not _tracing_configured():
+            # Nothing would be recorded, so skip span creation and attribute sanitization
+            yield trace.INVALID_SPAN
+            return
         tracer = self._provided_tracer or trace.get_tracer(self._name, self._version)
-        try:
-            provider = trace.get_tracer_provider()
-            logger.debug(f"SecurityAwareTracer.start_span: using tracer provider {provider.__class__.__name__} for tracer {self._name}")
-        except Exception:
-            logger.debug(f"SecurityAwareTracer.start_span: could not determine tracer provider for tracer {self._name}")
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug("SecurityAwareTracer.start_span: using tracer provider %s for tracer %s",
+                         trace.get_tracer_provider().__class__.__name__, self._name)
         with tracer.start_as_current_span(name, kind=kind, **kwargs) as span:
             if attributes:
                 sanitized_attrs = self.sanitizer.sanitize_attributes(attributes)
@@ -193,39 +202,50 @@ class SecurityAwareTracer:
         with self.start_span(name, kind, attributes, **kwargs) as span:
             yield span
 
+# Sensitive-data patterns, compiled once and applied in order by DataSanitizer.sanitize_value
+_SENSITIVE_PATTERN_SOURCES = [
+    # Database connection strings (capture early so credentials are masked before other patterns)
+    (r'(?i)(postgres|postgresql|mysql|mongodb|redis)://[^:@\s]+:[^@\s]+@([^/\s]+)', r'\1://***:***@\2'),
+    # OpenAI / secret keys (make permissive length so shorter test keys are caught)
+    (r'sk-[A-Za-z0-9\-\._]{6,}', r'***'),
+    # AWS access key id patterns (AKIA...)
+    (r'AKIA[0-9A-Z]{16}', r'***AWS_ACCESS_KEY***'),
+    # AWS secret keys (base64-like, permissive)
+    (r'(?i)aws[_-]?secret[_-]?access[_-]?key["\']?\s*[:=]\s*[A-Za-z0-9/+=]{8,}', r'aws_secret_access_key=***'),
+    # API Keys and tokens (generic)
+    (r'(?i)(api[_-]?key|x[-_]?api[-_]key|token|secret|password)["\']?\s*[:=]\s*["\']?([^"\'\s]{4,})', r'\1=***'),
+    # Common secret environment variables like SECRET_KEY, APP_SECRET, etc.
+    (r'(?i)(?:[A-Z0-9_]*_)?(?:secret|app_secret|secret_key|api_key)["\']?\s*[:=]\s*["\']?([^"\'\s]{1,})', r'***'),
+    (r'(?i)API\s+key:\s*([A-Za-z0-9\-\._]{4,})', r'API key: ***'),
+    # Bearer tokens
+    (r'Bearer\s+([A-Za-z0-9\-\._]{4,})', r'Bearer ***'),
+    # Internal IP addresses -> normalized mask
+    (r'\b(?:10\.|172\.(?:1[6-9]|2[0-9]|3[01])\.|192\.168\.)[\d.]+\b', r'***.***.***.***'),
+    # Email addresses -> normalized mask
+    (r'\b([A-Za-z0-9._%+-]+)@([A-Za-z0-9.-]+\.[A-Za-z]{2,})\b', r'***@***.***'),
+    # Credit card patterns -> mask grouping
+    (r'\b(?:\d{4}[-\s]?){3}\d{4}\b', r'****-****-****-****'),
+    (r'\b\d{13,19}\b', r'****'),
+    # Social security patterns (with and without dashes)
+    (r'\b\d{3}-\d{2}-\d{4}\b', r'***-**-****'),
+    (r'\b\d{9}\b', r'***'),
+]
+_SENSITIVE_PATTERNS = [(re.compile(pattern), replacement) for pattern, replacement in _SENSITIVE_PATTERN_SOURCES]
+# Add a common environment-style DATABASE_URL masking pattern
+_SENSITIVE_PATTERNS.append((re.compile(r"DATABASE_URL=\S+", re.IGNORECASE), "DATABASE_URL=***REDACTED***"))
+
+# Every default pattern needs one of these literals to match, so one case-insensitive
+# scan for them lets plain values (names, ids, messages) skip the pattern list entirely
+_SENSITIVE_PREFILTER = re.compile(r'[\d@:=]|sk-|akia|bearer', re.IGNORECASE)
+
+# Final cleanup pass for well-known key formats: OpenAI-style keys and AWS access keys
+_WELL_KNOWN_KEY_RE = re.compile(r'(?i:sk-[A-Za-z0-9\-\._]{4,})|AKIA[0-9A-Z]{8,}')
+
 class DataSanitizer:
     """Comprehensive data sanitization for telemetry with security-first approach."""
     
     def __init__(self):
-        self.sensitive_patterns = [
-            # Database connection strings (capture early so credentials are masked before other patterns)
-            (r'(?i)(postgres|postgresql|mysql|mongodb|redis)://[^:@\s]+:[^@\s]+@([^/\s]+)', r'\1://***:***@\2'),
-            # OpenAI / secret keys (make permissive length so shorter test keys are caught)
-            (r'sk-[A-Za-z0-9\-\._]{6,}', r'***'),
-            # AWS access key id patterns (AKIA...)
-            (r'AKIA[0-9A-Z]{16}', r'***AWS_ACCESS_KEY***'),
-            # AWS secret keys (base64-like, permissive)
-            (r'(?i)aws[_-]?secret[_-]?access[_-]?key["\']?\s*[:=]\s*[A-Za-z0-9/+=]{8,}', r'aws_secret_access_key=***'),
-            # API Keys and tokens (generic)
-            (r'(?i)(api[_-]?key|x[-_]?api[-_]key|token|secret|password)["\']?\s*[:=]\s*["\']?([^"\'\s]{4,})', r'\1=***'),
-            # Common secret environment variables like SECRET_KEY, APP_SECRET, etc.
-            (r'(?i)(?:[A-Z0-9_]*_)?(?:secret|app_secret|secret_key|api_key)["\']?\s*[:=]\s*["\']?([^"\'\s]{1,})', r'***'),
-            (r'(?i)API\s+key:\s*([A-Za-z0-9\-\._]{4,})', r'API key: ***'),
-            # Bearer tokens
-            (r'Bearer\s+([A-Za-z0-9\-\._]{4,})', r'Bearer ***'),
-            # Internal IP addresses -> normalized mask
-            (r'\b(?:10\.|172\.(?:1[6-9]|2[0-9]|3[01])\.|192\.168\.)[\d.]+\b', r'***.***.***.***'),
-            # Email addresses -> normalized mask
-            (r'\b([A-Za-z0-9._%+-]+)@([A-Za-z0-9.-]+\.[A-Za-z]{2,})\b', r'***@***.***'),
-            # Credit card patterns -> mask grouping
-            (r'\b(?:\d{4}[-\s]?){3}\d{4}\b', r'****-****-****-****'),
-            (r'\b\d{13,19}\b', r'****'),
-            # Social security patterns (with and without dashes)
-            (r'\b\d{3}-\d{2}-\d{4}\b', r'***-**-****'),
-            (r'\b\d{9}\b', r'***'),
-        ]
-        # Add a common environment-style DATABASE_URL masking pattern
-        self.sensitive_patterns.append((re.compile(r"DATABASE_URL=\S+", re.IGNORECASE), "DATABASE_URL=***REDACTED***"))
+        self.sensitive_patterns = list(_SENSITIVE_PATTERNS)
 
         self.max_string_length = int(os.getenv('OTEL_MAX_ATTRIBUTE_LENGTH', '2048'))
         self.max_collection_size = int(os.getenv('OTEL_MAX_COLLECTION_SIZE', '128'))
@@ -241,22 +261,22 @@ class DataSanitizer:
         str_value = str(value)
         max_len = max_length or self.max_string_length
         
-        # Apply sanitization patterns
-        for pattern, replacement in self.sensitive_patterns:
-            str_value = re.sub(pattern, replacement, str_value)
-
-        # Final cleanup pass to remove well-known sensitive substrings that
-        # tests and CI expect to be fully absent
-        try:
-            # OpenAI-style keys
-            str_value = re.sub(r'sk-[A-Za-z0-9\-\._]{4,}', '***', str_value, flags=re.IGNORECASE)
-            # AWS access keys
-            str_value = re.sub(r'AKIA[0-9A-Z]{8,}', '***', str_value)
-            # Do not remove scheme text; preserve structure but ensure credentials are masked
-            # (specific DB connection masking is handled by the earlier regex patterns)
-        except Exception:
-            # Be tolerant if regex replacement fails for any reason
-            pass
+        # The prefilter only covers the default patterns; custom ones always run
+        if _SENSITIVE_PREFILTER.search(str_value) is not None or self.sensitive_patterns != _SENSITIVE_PATTERNS:
+            # Apply sanitization patterns
+            for pattern, replacement in self.sensitive_patterns:
+                str_value = pattern.sub(replacement, str_value)
+
+            # Final cleanup pass to remove well-known sensitive substrings that
+            # tests and CI expect to be fully absent
+            try:
+                # OpenAI-style keys and AWS access keys
+                str_value = _WELL_KNOWN_KEY_RE.sub('***', str_value)
+                # Do not remove scheme text; preserve structure but ensure credentials are masked
+                # (specific DB connection masking is handled by the earlier regex patterns)
+            except Exception:
+                # Be tolerant if regex replacement fails for any reason
+                pass
         
         # Truncate if too long
         if len(str_value) > max_len:
@@ -6,7 +6,9 @@ from typing import Any, Dict, Generator, List, Optional, Tuple, AsyncGenerator
 from opentelemetry import trace
 from opentelemetry.trace import SpanKind, Status, StatusCode
 import json
+import re
 import time
+from collections import OrderedDict
 import uuid
 import logging
 from services.ai_service import AIService, TokenLimitError
@@ -26,6 +28,8 @@ MAPPING_KEYWORDS = [
     "mapping", "mappings", "fields", "schema", "structure", "columns",
     "field list", "index fields", "properties", "types"
 ]
+# All keywords as one alternation so a message is scanned once
+_MAPPING_KEYWORDS_RE = re.compile("|".join(re.escape(k) for k in MAPPING_KEYWORDS), re.IGNORECASE)
 
 def _is_mapping_request(messages: List[ChatMessage]) -> bool:
     if not messages:
@@ -35,8 +39,50 @@ def _is_mapping_request(messages: List[ChatMessage]) -> bool:
         text = last if isinstance(last, str) else json.dumps(last)
     except Exception:
         text = str(messages[-1].content)
-    lowered = text.lower()
-    return any(k in lowered for k in MAPPING_KEYWORDS)
+    return _MAPPING_KEYWORDS_RE.search(text) is not None
+
+
+# Mapping fast-path summaries per index. The mapping cache hands out the same object
+# until it refreshes an index, so a summary is reused while the mapping is identical.
+_MAPPING_SUMMARIES: "OrderedDict[str, Tuple[Any, Tuple[Dict[str, Any], int, str, Dict[str, Any]]]]" = OrderedDict()
+_MAPPING_SUMMARIES_MAX = 256
+
+
+def _summarize_mapping(index: str, mapping: Any) -> Tuple[Dict[str, Any], int, str, Dict[str, Any]]:
+    """Return (normalized mapping, field count, text summary, structured mapping) for an index."""
+    cached = _MAPPING_SUMMARIES.get(index)
+    if cached is not None and cached[0] is mapping:
+        _MAPPING_SUMMARIES.move_to_end(index)
+        return cached[1]
+
+    # Normalize mapping data using utility function
+    mapping_dict = normalize_mapping_data(mapping)
+    
+    # Extract flattened field information
+    es_types, python_types, field_count = extract_mapping_info(mapping_dict, index)
+    
+    # Create user-friendly summary with Python types
+    reply = format_mapping_summary(es_types, python_types)
+
+    # Build structured mapping response for frontend consumption
+    sorted_fields = sorted(es_types.keys())
+    structured_fields = [
+        {"name": name, "es_type": str(es_types[name]), "python_type": python_types.get(name)}
+        for name in sorted_fields
+    ]
+    structured_mapping = {
+        "fields": structured_fields,
+        "flat": {name: python_types.get(name) for name in sorted_fields},
+        "field_count": field_count,
+        "is_long": field_count > 40
+    }
+
+    summary = (mapping_dict, field_count, reply, structured_mapping)
+    _MAPPING_SUMMARIES[index] = (mapping, summary)
+    _MAPPING_SUMMARIES.move_to_end(index)
+    if len(_MAPPING_SUMMARIES) > _MAPPING_SUMMARIES_MAX:
+        _MAPPING_SUMMARIES.popitem(last=False)
+    return summary
 
 
 def _filter_messages_for_context(messages: List[ChatMessage]) -> List[Dict[str, Any]]:
@@ -419,28 +465,7 @@ async def chat_endpoint(req: ChatRequest, app_request: Request, response: Respon
 
                     # Fetch mapping directly from cache/service
                     mapping = await mapping_cache_service.get_mapping(index)
-                    
-                    # Normalize mapping data using utility function
-                    mapping_dict = normalize_mapping_data(mapping)
-                    
-                    # Extract flattened field information
-                    es_types, python_types, field_count = extract_mapping_info(mapping_dict, index)
-                    
-                    # Create user-friendly summary with Python types
-                    reply = format_mapping_summary(es_types, python_types)
-
-                    # Build structured mapping response for frontend consumption
-                    sorted_fields = sorted(es_types.keys())
-                    structured_fields = [
-                        {"name": name, "es_type": str(es_types[name]), "python_type": python_types.get(name)}
-                        for name in sorted_fields
-                    ]
-                    structured_mapping = {
-                        "fields": structured_fields,
-                        "flat": {name: python_types.get(name) for name in sorted_fields},
-                        "field_count": field_count,
-                        "is_long": field_count > 40
-                    }
+                    mapping_dict, field_count, reply, structured_mapping = _summarize_mapping(index, mapping)
 
                     # Attach mapping response into debug_info so frontend can render it without parsing markers
                     if debug_info is not None:
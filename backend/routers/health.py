@@ -192,11 +192,8 @@ async def get_performance_stats(app_request: Request):
                              es_stats["total_requests"]) * 100
         
         cache_hit_rate = 0
-        if hasattr(mapping_service, 'cache_hits') and hasattr(mapping_service, 'cache_misses'):
-            # This would need to be implemented in the mapping service
-            total_cache_requests = getattr(mapping_service, '_total_cache_requests', 0)
-            if total_cache_requests > 0:
-                cache_hit_rate = (cache_stats.get('cache_hits', 0) / total_cache_requests) * 100
+        if cache_stats.get('cache_hit_ratio') is not None:
+            cache_hit_rate = cache_stats['cache_hit_ratio'] * 100
         
         performance_data = {
             "elasticsearch": {
@@ -219,6 +216,9 @@ async def get_performance_stats(app_request: Request):
         if cache_hit_rate < 70:
             performance_data["recommendations"].append("Cache hit rate is low - consider increasing cache refresh frequency")
             
+        if es_stats.get("peak_queued_requests", 0) > 0:
+            performance_data["recommendations"].append("Requests have waited for a free Elasticsearch connection - consider raising ELASTICSEARCH_POOL_MAXSIZE")
+        
         if es_stats["avg_response_time"] > 5000:  # 5 seconds
             performance_data["recommendations"].append("High average response time - check Elasticsearch cluster health")
         
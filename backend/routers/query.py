@@ -1,4 +1,5 @@
 from fastapi import APIRouter, HTTPException, Request
+from fastapi.responses import JSONResponse
 import time
 from pydantic import BaseModel
 from typing import Dict, Any, List
@@ -11,6 +12,14 @@ logger = logging.getLogger(__name__)
 tracer = trace.get_tracer(__name__)
 router = APIRouter()
 
+# Mapping payloads can be large; returning a rendered response skips FastAPI's
+# jsonable_encoder walk over them, and orjson encodes them faster when installed
+try:
+    import orjson  # noqa: F401
+    from fastapi.responses import ORJSONResponse as _RenderedJSONResponse
+except ImportError:
+    _RenderedJSONResponse = JSONResponse
+
 # Shared models
 class ChatRequest(BaseModel):
     message: str
@@ -139,12 +148,13 @@ async def get_indices(app_request: Request, tier: str = None):
         # Note: This would require tier information to be included in the index metadata
         # For now, we'll return all indices as most ES deployments don't have explicit tier info
         # In a real implementation, you'd query ES cluster state or use index settings
+        wanted_tier = tier.lower()
         filtered_indices = []
         for index in indices:
             # You could check index settings here for tier allocation
             # For demonstration, we'll assume tier information is available
             index_tier = getattr(index, 'tier', 'hot')  # Default to hot
-            if tier.lower() == index_tier.lower():
+            if index_tier.lower() == wanted_tier:
                 filtered_indices.append(index)
         
         return filtered_indices
@@ -164,12 +174,12 @@ async def get_mapping(index_name: str, app_request: Request):
             schema = await mapping_service.get_schema(index_name)
             fields = schema.get('properties', {}) if schema else {}
             is_long = len(fields) > 100
-            return {
+            return _RenderedJSONResponse({
                 'index_name': index_name,
                 'fields': fields,
                 'is_long': is_long,
                 'raw_mapping': mapping
-            }
+            })
 
         except Exception as e:
             logger.error(f"Get mapping error: {e}")
@@ -220,6 +230,21 @@ async def refresh_cache(app_request: Request):
         logger.error(f"Cache refresh error: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
+# Simple heuristics for tier classification based on index name patterns, checked in order
+_TIER_NAME_PATTERNS = (
+    ('warm', ('warm', 'week', 'monthly')),
+    ('cold', ('cold', 'archive', 'old')),
+    ('frozen', ('frozen', 'backup')),
+)
+
+def _classify_tier(index_name: str) -> str:
+    """Guess an index's data tier from its name, defaulting to hot."""
+    name = index_name.lower()
+    for tier, patterns in _TIER_NAME_PATTERNS:
+        if any(pattern in name for pattern in patterns):
+            return tier
+    return 'hot'
+
 @router.get("/tiers")
 @tracer.start_as_current_span("get_tiers")
 async def get_tiers(app_request: Request):
@@ -244,15 +269,7 @@ async def get_tiers(app_request: Request):
             # In a real implementation, you'd check the index settings for tier allocation
             index_name = index if isinstance(index, str) else index.get('name', str(index))
             
-            tier = 'hot'  # Default tier
-            
-            # Simple heuristics for tier classification based on index patterns
-            if any(pattern in index_name.lower() for pattern in ['warm', 'week', 'monthly']):
-                tier = 'warm'
-            elif any(pattern in index_name.lower() for pattern in ['cold', 'archive', 'old']):
-                tier = 'cold' 
-            elif any(pattern in index_name.lower() for pattern in ['frozen', 'backup']):
-                tier = 'frozen'
+            tier = _classify_tier(index_name)
             
             tier_stats[tier]['count'] += 1
             tier_stats[tier]['indices'].append(index_name)
@@ -19,6 +19,20 @@ tracer = get_security_tracer(__name__)
 # Initialize data sanitizer for enhanced security
 sanitizer = DataSanitizer()
 
+# Debug-output redactions, compiled once and applied in order
+_LONG_TOKEN_RE = re.compile(r"[A-Za-z0-9_\-]{20,}")
+_DEBUG_REDACTIONS = (
+    (re.compile(r"Bearer\s+[A-Za-z0-9\-\._]{8,}", re.IGNORECASE), "Bearer [REDACTED]"),
+    (re.compile(r"sk-[A-Za-z0-9]{8,}"), "sk-[REDACTED]"),
+    (re.compile(r"[Pp]assword=\w+"), "password=[REDACTED]"),
+    # Simple API keys (long alphanumeric strings)
+    (_LONG_TOKEN_RE, "[REDACTED]"),
+    # Private 10.x and 192.168.x addresses in one pass
+    (re.compile(r"\b(?:10\.\d{1,3}|192\.168)\.\d{1,3}\.\d{1,3}\b"), "[REDACTED_IP]"),
+)
+# The module-level fallback leaves long tokens alone
+_FALLBACK_REDACTIONS = tuple(item for item in _DEBUG_REDACTIONS if item[0] is not _LONG_TOKEN_RE)
+
 class TokenLimitError(Exception):
     def __init__(self, message: str, *, model: str, limit: int, prompt_tokens: int, reserved_for_output: int):
         super().__init__(message)
@@ -596,15 +610,9 @@ class AIService:
                 except Exception:
                     s = str(s)
 
-            # Mask bearer tokens and OpenAI-style keys
-            s = re.sub(r"Bearer\s+[A-Za-z0-9\-\._]{8,}", "Bearer [REDACTED]", s, flags=re.IGNORECASE)
-            s = re.sub(r"sk-[A-Za-z0-9]{8,}", "sk-[REDACTED]", s)
-            s = re.sub(r"[Pp]assword=\w+", "password=[REDACTED]", s)
-            # Mask simple API keys (long alphanumeric strings)
-            s = re.sub(r"[A-Za-z0-9_\-]{20,}", "[REDACTED]", s)
-            # Mask private/internal IPs
-            s = re.sub(r"\b10\.\d{1,3}\.\d{1,3}\.\d{1,3}\b", "[REDACTED_IP]", s)
-            s = re.sub(r"\b192\.168\.\d{1,3}\.\d{1,3}\b", "[REDACTED_IP]", s)
+            # Mask bearer tokens, OpenAI-style keys, passwords, long API keys and private IPs
+            for pattern, replacement in _DEBUG_REDACTIONS:
+                s = pattern.sub(replacement, s)
             # Truncate
             if len(s) > max_len:
                 s = s[:max_len] + "..."
@@ -1457,11 +1465,8 @@ def _sanitize_for_debug(obj, max_len: int = 500) -> str:
             s = obj if isinstance(obj, str) else json.dumps(obj)
         except Exception:
             s = str(obj)
-        s = re.sub(r"Bearer\s+[A-Za-z0-9\-\._]{8,}", "Bearer [REDACTED]", s, flags=re.IGNORECASE)
-        s = re.sub(r"sk-[A-Za-z0-9]{8,}", "sk-[REDACTED]", s)
-        s = re.sub(r"[Pp]assword=\w+", "password=[REDACTED]", s)
-        s = re.sub(r"\b10\.\d{1,3}\.\d{1,3}\.\d{1,3}\b", "[REDACTED_IP]", s)
-        s = re.sub(r"\b192\.168\.\d{1,3}\.\d{1,3}\b", "[REDACTED_IP]", s)
+        for pattern, replacement in _FALLBACK_REDACTIONS:
+            s = pattern.sub(replacement, s)
         if len(s) > max_len:
             s = s[:max_len] + "..."
         return s
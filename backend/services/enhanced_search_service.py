@@ -5,24 +5,339 @@ and comprehensive error handling with detailed logging.
 """
 
 import json
+import hashlib
 import logging
 import asyncio
-import re
-from typing import Dict, Any, List, Optional, Union, Tuple
-from datetime import datetime, timedelta
-from dataclasses import dataclass, asdict
+import os
+import time
+from bisect import bisect_left
+from collections import OrderedDict, defaultdict, deque
+from typing import Dict, Any, List, Optional, Tuple, Hashable, Callable
+from dataclasses import dataclass, replace
 from enum import Enum
 
-from opentelemetry import trace
 from opentelemetry.trace.status import Status, StatusCode
 
 from .elasticsearch_service import ElasticsearchService
 from .ai_service import AIService
-from middleware.enhanced_telemetry import get_security_tracer, trace_async_function, DataSanitizer
+from middleware.enhanced_telemetry import get_security_tracer, trace_async_function, trace_function, DataSanitizer
 
 logger = logging.getLogger(__name__)
+
+# Measuring a response only needs its encoded length and cache keys only need a stable
+# encoding; orjson produces bytes directly without building an intermediate str
+try:
+    import orjson
+
+    def _json_nbytes(obj: Any) -> int:
+        return len(orjson.dumps(obj, default=str, option=orjson.OPT_NON_STR_KEYS))
+
+    def _canonical_json(obj: Any) -> bytes:
+        return orjson.dumps(obj, default=str, option=orjson.OPT_SORT_KEYS | orjson.OPT_NON_STR_KEYS)
+except ImportError:
+    def _json_nbytes(obj: Any) -> int:
+        return len(json.dumps(obj, default=str))
+
+    def _canonical_json(obj: Any) -> bytes:
+        return json.dumps(obj, sort_keys=True, separators=(",", ":"), default=str).encode()
+
+_EXACT_MEMORY_ESTIMATE = os.getenv("ENHANCED_SEARCH_EXACT_MEMORY_ESTIMATE", "false").lower() == "true"
+
 tracer = get_security_tracer(__name__)
 
+class _LRUCache:
+    """Size-bounded LRU cache whose entries optionally expire after ttl seconds."""
+
+    def __init__(self, maxsize: int, ttl: Optional[float] = None):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data: "OrderedDict[Hashable, Tuple[float, Any]]" = OrderedDict()
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        entry = self._data.get(key)
+        if entry is None:
+            return default
+        expires_at, value = entry
+        if expires_at < time.monotonic():
+            del self._data[key]
+            return default
+        self._data.move_to_end(key)
+        return value
+
+    def put(self, key: Hashable, value: Any):
+        if self.maxsize <= 0 or self.ttl == 0:
+            return
+        expires_at = time.monotonic() + self.ttl if self.ttl else float("inf")
+        self._data[key] = (expires_at, value)
+        self._data.move_to_end(key)
+        if len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
+
+    def clear(self):
+        self._data.clear()
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+
+def _query_fingerprint(query: Any) -> bytes:
+    """Stable digest of a query body, independent of key order."""
+    return hashlib.blake2b(_canonical_json(query), digest_size=16).digest()
+
+
+# Prompt for AI-generated related queries; kept free of indentation so none of it
+# is sent to the model
+_RELATED_QUERIES_PROMPT = (
+    "Based on the search query with terms: {terms}\n"
+    "Generate 3 related search queries that users might be interested in.\n"
+    "Return only the search terms, not full Elasticsearch queries."
+)
+
+
+def _masked_shell(node: Any) -> Any:
+    """The masked form of a scalar or all-scalar list, else an empty container to fill."""
+    if isinstance(node, dict):
+        return {}
+    if isinstance(node, list):
+        if all(not isinstance(item, (dict, list)) for item in node):
+            return "<list>"
+        return [None] * len(node)
+    return f"<{type(node).__name__}>"
+
+
+def _mask_values(node: Any) -> Any:
+    """Replace scalar values in a query clause with their type names, keeping keys.
+
+    Walks iteratively, like _walk_query, so deeply nested queries can't exhaust the stack.
+    """
+    root = _masked_shell(node)
+    # (source container, masked container being filled)
+    stack = [(node, root)] if isinstance(root, (dict, list)) else []
+    while stack:
+        source, target = stack.pop()
+        for key, value in (source.items() if isinstance(source, dict) else enumerate(source)):
+            target[key] = masked = _masked_shell(value)
+            if isinstance(masked, (dict, list)):
+                stack.append((value, masked))
+    return root
+
+
+def _query_shape(query: Dict[str, Any]) -> Dict[str, Any]:
+    """The request body with search values under "query" masked.
+
+    Everything else (size, sort, aggs, ...) is kept verbatim since the analysis
+    depends on those values.
+    """
+    if not isinstance(query.get("query"), dict):
+        return query
+    return dict(query, query=_mask_values(query["query"]))
+
+
+# Query DSL clause names reported as query types
+_QUERY_KEYWORDS = frozenset({
+    "match", "term", "range", "bool", "wildcard", "regexp",
+    "fuzzy", "prefix", "exists", "nested", "has_child", "has_parent",
+    "function_score", "dis_max", "constant_score", "boosting",
+})
+
+
+# Complexity weights of query types: simple 1, medium 2, complex 4
+_SIMPLE_QUERIES = frozenset({"match", "term", "range", "exists"})
+_MEDIUM_QUERIES = frozenset({"bool", "wildcard", "fuzzy", "prefix"})
+_COMPLEX_QUERIES = frozenset({"nested", "has_child", "has_parent", "function_score"})
+
+# Aggregation types adding 1 (bucketing and metrics) or 2 (nested) to aggregation complexity
+_SIMPLE_AGGS = frozenset({
+    "terms", "date_histogram", "histogram",
+    "percentiles", "percentile_ranks", "stats", "extended_stats",
+})
+_NESTED_AGGS = frozenset({"nested", "reverse_nested"})
+
+# Query types that narrow the result set before sorting
+_FILTERING_QUERIES = frozenset({"term", "range", "bool"})
+
+# Full-text clauses whose values are used as search terms
+_TEXT_MATCH_QUERIES = frozenset({"match", "match_phrase"})
+
+
+@dataclass
+class _QuerySignals:
+    """Structural facts about a query collected in a single traversal."""
+    query_types: List[str]
+    field_usage: Dict[str, int]
+    has_filter: bool
+    has_terms_agg: bool
+
+
+def _walk_query(query: Dict[str, Any], properties: Dict[str, Any]) -> _QuerySignals:
+    """Walk the query once, iteratively, collecting query types, field usage and clause flags.
+
+    Query types are only collected under the top-level "query" and terms aggregations
+    only under the top-level "aggs"; field usage covers the whole body. Fields under a
+    dict-valued key count twice, as they always have in the usage scores.
+    """
+    query_types = set()
+    field_usage: Dict[str, int] = defaultdict(int)
+    has_filter = False
+    has_terms_agg = False
+
+    # (node, usage weight, inside "query", inside "aggs", is the root)
+    stack = [(query, 1, False, False, True)]
+    while stack:
+        node, weight, in_query, in_aggs, is_root = stack.pop()
+        for key, value in node.items():
+            if key in properties:
+                field_usage[key] += weight
+            if in_query and key in _QUERY_KEYWORDS:
+                query_types.add(key)
+            if key == "filter":
+                has_filter = True
+            elif in_aggs and key == "terms":
+                has_terms_agg = True
+
+            if isinstance(value, dict):
+                stack.append((value, 2, in_query or (is_root and key == "query"),
+                              in_aggs or (is_root and key == "aggs"), False))
+            elif isinstance(value, list):
+                child_in_query = in_query or (is_root and key == "query")
+                child_in_aggs = in_aggs or (is_root and key == "aggs")
+                stack.extend((item, 1, child_in_query, child_in_aggs, False)
+                             for item in value if isinstance(item, dict))
+
+    return _QuerySignals(list(query_types), dict(field_usage), has_filter, has_terms_agg)
+
+
+@dataclass(frozen=True)
+class _OptimizationRule:
+    """A structural check over an analysed query and the suggestion it produces."""
+    name: str
+    message: str
+    matches: Callable[[Dict[str, Any], _QuerySignals], bool]
+
+
+# Evaluated in order against the signals gathered by _walk_query
+_OPTIMIZATION_RULES = (
+    _OptimizationRule(
+        "bool_without_filter",
+        "Consider using filter context for non-scoring clauses",
+        lambda query, signals: "bool" in signals.query_types and not signals.has_filter,
+    ),
+    _OptimizationRule(
+        "wildcard_query",
+        "Wildcard queries can be slow - consider using prefix or edge_ngram",
+        lambda query, signals: "wildcard" in signals.query_types,
+    ),
+    _OptimizationRule(
+        "unfiltered_sort",
+        "Sorting large result sets - consider adding filters",
+        lambda query, signals: bool(query.get("sort")) and _FILTERING_QUERIES.isdisjoint(signals.query_types),
+    ),
+    _OptimizationRule(
+        "terms_aggregation",
+        "Terms aggregations on high cardinality fields can be expensive",
+        lambda query, signals: signals.has_terms_agg,
+    ),
+)
+
+
+def _has_keyword_subfield(field_config: Dict[str, Any]) -> bool:
+    """Whether a field mapping has a keyword multi-field (e.g. title.keyword)."""
+    return any(
+        isinstance(sub, dict) and sub.get("type") == "keyword"
+        for sub in field_config.get("fields", {}).values()
+    )
+
+
+# Leaf queries whose score does not depend on relevance, safe to run in filter context
+_FILTERABLE_QUERIES = frozenset({"term", "terms", "range", "exists", "prefix"})
+_BOOL_CLAUSES = ("must", "filter", "should", "must_not")
+
+
+def _to_filter_context(node: Any) -> Any:
+    """Return node with filterable bool.must leaves moved to bool.filter, recursively.
+
+    The input is never modified: rewritten bool queries are new dicts and unchanged
+    subtrees are returned as-is. Recursion depth is bounded by Elasticsearch's own
+    limit on nested bool queries.
+    """
+    if not isinstance(node, dict) or len(node) != 1 or not isinstance(node.get("bool"), dict):
+        return node
+
+    bool_query = node["bool"]
+    rewritten = dict(bool_query)
+    changed = False
+    for occurrence in _BOOL_CLAUSES:
+        clauses = bool_query.get(occurrence)
+        if clauses is None:
+            continue
+        clause_list = clauses if isinstance(clauses, list) else [clauses]
+        converted = [_to_filter_context(clause) for clause in clause_list]
+        if any(new is not old for new, old in zip(converted, clause_list)):
+            rewritten[occurrence] = converted if isinstance(clauses, list) else converted[0]
+            changed = True
+
+    must = rewritten.get("must")
+    if must is not None:
+        keep, move = [], []
+        for clause in must if isinstance(must, list) else [must]:
+            filterable = isinstance(clause, dict) and len(clause) == 1 and next(iter(clause)) in _FILTERABLE_QUERIES
+            (move if filterable else keep).append(clause)
+        if move:
+            existing = rewritten.get("filter", [])
+            rewritten["filter"] = (existing if isinstance(existing, list) else [existing]) + move
+            if keep:
+                rewritten["must"] = keep
+            else:
+                del rewritten["must"]
+            changed = True
+
+    return {"bool": rewritten} if changed else node
+
+
+# Upper bounds applied to aggregations by the performance strategy
+_MAX_TERMS_AGG_SIZE = 1000
+_MAX_CARDINALITY_PRECISION = 3000
+
+
+def _simplify_agg(agg_type: str, config: Any) -> Any:
+    """Return a capped copy of one aggregation's settings, or config if already cheap."""
+    if not isinstance(config, dict):
+        return config
+    capped = None
+    if agg_type == "terms":
+        size = config.get("size")
+        if isinstance(size, int) and size > _MAX_TERMS_AGG_SIZE:
+            capped = dict(config, size=_MAX_TERMS_AGG_SIZE)
+        if config.get("min_doc_count") == 0:
+            capped = dict(capped or config, min_doc_count=1)
+    elif agg_type == "cardinality":
+        precision = config.get("precision_threshold")
+        if isinstance(precision, int) and precision > _MAX_CARDINALITY_PRECISION:
+            capped = dict(config, precision_threshold=_MAX_CARDINALITY_PRECISION)
+    return config if capped is None else capped
+
+
+def _simplify_agg_tree(aggs: Dict[str, Any]) -> Dict[str, Any]:
+    """Apply _simplify_agg throughout an aggregation tree without modifying it."""
+    rewritten = None
+    for name, body in aggs.items():
+        if not isinstance(body, dict):
+            continue
+        new_body = None
+        for key, value in body.items():
+            if key in ("aggs", "aggregations"):
+                new_value = _simplify_agg_tree(value) if isinstance(value, dict) else value
+            else:
+                new_value = _simplify_agg(key, value)
+            if new_value is not value:
+                new_body = new_body or dict(body)
+                new_body[key] = new_value
+        if new_body is not None:
+            rewritten = rewritten or dict(aggs)
+            rewritten[name] = new_body
+    return aggs if rewritten is None else rewritten
+
+
 class QueryComplexity(Enum):
     """Query complexity levels for optimization decisions."""
     SIMPLE = "simple"
@@ -30,6 +345,18 @@ class QueryComplexity(Enum):
     COMPLEX = "complex"
     ADVANCED = "advanced"
 
+# Score penalties by complexity level
+_COMPLEXITY_PENALTIES = {
+    QueryComplexity.SIMPLE: 0,
+    QueryComplexity.MEDIUM: 10,
+    QueryComplexity.COMPLEX: 25,
+    QueryComplexity.ADVANCED: 40,
+}
+
+# Score penalties for estimated matches above each threshold
+_DOC_COUNT_THRESHOLDS = (10000, 100000, 1000000)
+_DOC_COUNT_PENALTIES = (0, 10, 20, 30)
+
 class SearchOptimization(Enum):
     """Search optimization strategies."""
     PERFORMANCE = "performance"
@@ -83,8 +410,22 @@ class EnhancedSearchService:
         self.es_service = es_service
         self.ai_service = ai_service
         self.sanitizer = DataSanitizer()
-        self.query_cache = {}
-        self.performance_history = {}
+        # Analyses are reused for repeated (index, query) pairs; document counts go stale
+        # faster, so they get their own shorter-lived cache and are re-read on every hit
+        self.query_cache = _LRUCache(
+            maxsize=1024, ttl=float(os.getenv("ENHANCED_SEARCH_ANALYSIS_CACHE_TTL", "300")))
+        self._count_cache = _LRUCache(
+            maxsize=1024, ttl=float(os.getenv("ENHANCED_SEARCH_COUNT_CACHE_TTL", "30")))
+        # Structural analyses keyed by query shape; they embed the index mapping, so
+        # they expire with the analysis cache
+        self._shape_cache = _LRUCache(
+            maxsize=1024, ttl=float(os.getenv("ENHANCED_SEARCH_ANALYSIS_CACHE_TTL", "300")))
+        # AI-generated related queries depend only on the search terms and are slow to produce
+        self._related_cache = _LRUCache(
+            maxsize=4096, ttl=float(os.getenv("ENHANCED_SEARCH_RELATED_CACHE_TTL", "3600")))
+        # Recent data points per query signature; idle signatures age out after an hour
+        self.performance_history = _LRUCache(
+            maxsize=10000, ttl=float(os.getenv("ENHANCED_SEARCH_HISTORY_TTL", "3600")))
         
     @trace_async_function("search.execute_enhanced", include_args=True)
     async def execute_enhanced_search(self,
@@ -125,18 +466,26 @@ class EnhancedSearchService:
                     search_params["profile"] = True
                 
                 # Execute search with timing
-                start_time = asyncio.get_event_loop().time()
+                start_time = time.perf_counter()
                 response = await self.es_service.client.search(**search_params)
-                execution_time = (asyncio.get_event_loop().time() - start_time) * 1000
+                execution_time = (time.perf_counter() - start_time) * 1000
                 
                 # Extract metrics
                 metrics = self._extract_metrics(response, execution_time)
                 span.set_attribute("search.took_ms", metrics.query_time_ms)
                 span.set_attribute("search.total_hits", metrics.total_hits)
                 
-                # Generate suggestions and related queries
-                suggestions = await self._generate_suggestions(index_name, query, analysis, response)
-                related_queries = await self._generate_related_queries(index_name, query, response)
+                # Suggestions are rule-based and cheap; related queries need the AI service
+                try:
+                    suggestions = self._generate_suggestions(index_name, query, analysis, response)
+                except Exception as e:
+                    logger.debug("Failed to generate suggestions: %s", e)
+                    suggestions = []
+                try:
+                    related_queries = await self._generate_related_queries(index_name, query, response)
+                except Exception as e:
+                    logger.debug("Failed to generate related queries: %s", e)
+                    related_queries = []
                 
                 # Build enhanced result
                 result = EnhancedSearchResult(
@@ -154,7 +503,7 @@ class EnhancedSearchService:
                 )
                 
                 # Update performance history
-                await self._update_performance_history(index_name, query, metrics, analysis)
+                self._update_performance_history(index_name, query, metrics, analysis)
                 
                 span.set_status(Status(StatusCode.OK))
                 return result
@@ -170,19 +519,43 @@ class EnhancedSearchService:
         """Analyze query complexity and characteristics."""
         
         with tracer.start_span("query_analysis") as span:
+            cache_key = (index_name, _query_fingerprint(query))
+            cached = self.query_cache.get(cache_key)
+            span.set_attribute("analysis.cache_hit", cached is not None)
+            if cached is not None:
+                # The count has its own shorter TTL; keep the analysis only while it matches
+                estimated_docs = await self._estimate_affected_documents(index_name, query)
+                if estimated_docs != cached.estimated_docs:
+                    cached = self._with_estimate(cached, estimated_docs)
+                    self.query_cache.put(cache_key, cached)
+                return cached
+            
             try:
-                # Get index mapping for analysis
-                mapping = await self.es_service.get_index_mapping(index_name)
+                # Queries that differ only in their search values share everything but
+                # the document estimate, so reuse the structural analysis for the shape
+                shape_key = (index_name, _query_fingerprint(_query_shape(query)))
+                template = self._shape_cache.get(shape_key)
+                span.set_attribute("analysis.shape_hit", template is not None)
+                if template is not None:
+                    estimated_docs = await self._estimate_affected_documents(index_name, query)
+                    analysis = self._with_estimate(template, estimated_docs)
+                    self.query_cache.put(cache_key, analysis)
+                    return analysis
+                
+                # Fetch the index mapping and estimate the document count concurrently;
+                # neither depends on the other
+                mapping, estimated_docs = await asyncio.gather(
+                    self.es_service.get_index_mapping(index_name),
+                    self._estimate_affected_documents(index_name, query),
+                )
                 properties = mapping.get(index_name, {}).get("mappings", {}).get("properties", {})
                 
-                # Analyze query structure
-                query_types = self._extract_query_types(query)
-                field_usage = self._analyze_field_usage(query, properties)
+                # Analyze query structure in a single pass
+                signals = _walk_query(query, properties)
+                query_types = signals.query_types
+                field_usage = signals.field_usage
                 complexity = self._determine_complexity(query, query_types)
                 
-                # Estimate document count impact
-                estimated_docs = await self._estimate_affected_documents(index_name, query)
-                
                 # Identify semantic fields
                 semantic_fields = self._identify_semantic_fields(properties, field_usage)
                 
@@ -194,7 +567,7 @@ class EnhancedSearchService:
                 
                 # Generate optimization opportunities
                 optimization_opportunities = self._identify_optimization_opportunities(
-                    query, query_types, field_usage, properties
+                    query, signals, properties
                 )
                 
                 # Calculate performance score
@@ -224,6 +597,8 @@ class EnhancedSearchService:
                 span.set_attribute("analysis.performance_score", performance_score)
                 span.set_attribute("analysis.field_count", len(field_usage))
                 
+                self.query_cache.put(cache_key, analysis)
+                self._shape_cache.put(shape_key, analysis)
                 return analysis
                 
             except Exception as e:
@@ -231,71 +606,40 @@ class EnhancedSearchService:
                 logger.error(f"Query analysis failed: {e}")
                 raise
 
+    def _with_estimate(self, analysis: QueryAnalysis, estimated_docs: int) -> QueryAnalysis:
+        """Copy of analysis with a new document estimate and the score that follows from it."""
+        return replace(
+            analysis,
+            estimated_docs=estimated_docs,
+            performance_score=self._calculate_performance_score(
+                analysis.complexity, estimated_docs,
+                analysis.aggregation_complexity, analysis.index_coverage
+            ),
+        )
+
     def _extract_query_types(self, query: Dict[str, Any]) -> List[str]:
         """Extract all query types used in the query."""
-        query_types = []
-        
-        def extract_from_dict(d: Dict[str, Any], path: str = ""):
-            for key, value in d.items():
-                if key in ["match", "term", "range", "bool", "wildcard", "regexp", 
-                          "fuzzy", "prefix", "exists", "nested", "has_child", "has_parent",
-                          "function_score", "dis_max", "constant_score", "boosting"]:
-                    query_types.append(key)
-                
-                if isinstance(value, dict):
-                    extract_from_dict(value, f"{path}.{key}" if path else key)
-                elif isinstance(value, list):
-                    for item in value:
-                        if isinstance(item, dict):
-                            extract_from_dict(item, f"{path}.{key}" if path else key)
-        
-        query_body = query.get("query", {})
-        if query_body:
-            extract_from_dict(query_body)
-        
-        return list(set(query_types))
+        return _walk_query(query, {}).query_types
 
     def _analyze_field_usage(self, query: Dict[str, Any], properties: Dict[str, Any]) -> Dict[str, int]:
         """Analyze which fields are used and how often."""
-        field_usage = {}
-        
-        def analyze_dict(d: Dict[str, Any]):
-            for key, value in d.items():
-                # Check if this is a field reference
-                if key in properties:
-                    field_usage[key] = field_usage.get(key, 0) + 1
-                
-                # Look for field references in common query structures
-                if isinstance(value, dict):
-                    # Check for field references in nested structures
-                    for nested_key in value.keys():
-                        if nested_key in properties:
-                            field_usage[nested_key] = field_usage.get(nested_key, 0) + 1
-                    analyze_dict(value)
-                elif isinstance(value, list):
-                    for item in value:
-                        if isinstance(item, dict):
-                            analyze_dict(item)
-        
-        analyze_dict(query)
-        return field_usage
+        return _walk_query(query, properties).field_usage
 
     def _determine_complexity(self, query: Dict[str, Any], query_types: List[str]) -> QueryComplexity:
         """Determine overall query complexity."""
         complexity_score = 0
         
         # Base complexity from query types
-        simple_queries = ["match", "term", "range", "exists"]
-        medium_queries = ["bool", "wildcard", "fuzzy", "prefix"]
-        complex_queries = ["nested", "has_child", "has_parent", "function_score"]
-        
         for q_type in query_types:
-            if q_type in simple_queries:
+            if q_type in _SIMPLE_QUERIES:
                 complexity_score += 1
-            elif q_type in medium_queries:
+            elif q_type in _MEDIUM_QUERIES:
                 complexity_score += 2
-            elif q_type in complex_queries:
+            elif q_type in _COMPLEX_QUERIES:
                 complexity_score += 4
+            # Scores only grow, so nothing below can change the outcome past this point
+            if complexity_score > 10:
+                return QueryComplexity.ADVANCED
         
         # Additional complexity factors
         if query.get("aggs"):
@@ -318,12 +662,25 @@ class EnhancedSearchService:
             return QueryComplexity.ADVANCED
 
     async def _estimate_affected_documents(self, index_name: str, query: Dict[str, Any]) -> int:
-        """Estimate number of documents that would be affected."""
+        """Estimate number of documents that would be affected.
+
+        Returns 0 when no estimate is made: for count-only queries, and when the count
+        request fails.
+        """
+        # A size-0 search without aggregations is itself just a count; the main search
+        # reports hits.total, so a separate count request would only duplicate it
+        if query.get("size") == 0 and "aggs" not in query and "aggregations" not in query:
+            return 0
         try:
             # Use count API for estimation
             count_query = {"query": query.get("query", {"match_all": {}})}
-            response = await self.es_service.client.count(index=index_name, body=count_query)
-            return response.get("count", 0)
+            cache_key = (index_name, _query_fingerprint(count_query))
+            count = self._count_cache.get(cache_key)
+            if count is None:
+                response = await self.es_service.client.count(index=index_name, body=count_query)
+                count = response.get("count", 0)
+                self._count_cache.put(cache_key, count)
+            return count
         except Exception as e:
             logger.debug(f"Failed to estimate document count: {e}")
             return 0
@@ -347,30 +704,25 @@ class EnhancedSearchService:
         
         complexity = 0
         
-        def analyze_agg(agg_def: Dict[str, Any]):
-            nonlocal complexity
-            # agg_def is typically a dict mapping agg_name -> agg_body
-            for name, body in agg_def.items():
+        # agg_defs map agg_name -> agg_body; the body holds the aggregation type as a key
+        stack = [aggs]
+        while stack:
+            agg_def = stack.pop()
+            for body in agg_def.values():
                 if not isinstance(body, dict):
                     continue
-                # Body may contain the specific aggregation type as a key
                 for agg_type, agg_config in body.items():
-                    if agg_type in ["terms", "date_histogram", "histogram"]:
+                    if agg_type in _SIMPLE_AGGS:
                         complexity += 1
-                    elif agg_type in ["nested", "reverse_nested"]:
+                    elif agg_type in _NESTED_AGGS:
                         complexity += 2
-                    elif agg_type in ["percentiles", "percentile_ranks", "stats", "extended_stats"]:
-                        complexity += 1
                     # sub-aggregations are usually under 'aggs' or 'aggregations'
                     if isinstance(agg_config, dict):
-                        if 'aggs' in agg_config and isinstance(agg_config['aggs'], dict):
-                            analyze_agg(agg_config['aggs'])
-                        if 'aggregations' in agg_config and isinstance(agg_config['aggregations'], dict):
-                            analyze_agg(agg_config['aggregations'])
-                # Also check for nested structure where agg_def directly contains agg types
-                # (already handled above)
-
-        analyze_agg(aggs)
+                        if isinstance(agg_config.get('aggs'), dict):
+                            stack.append(agg_config['aggs'])
+                        if isinstance(agg_config.get('aggregations'), dict):
+                            stack.append(agg_config['aggregations'])
+        
         return complexity
 
     def _calculate_index_coverage(self, field_usage: Dict[str, int], properties: Dict[str, Any]) -> float:
@@ -385,35 +737,15 @@ class EnhancedSearchService:
 
     def _identify_optimization_opportunities(self,
                                            query: Dict[str, Any],
-                                           query_types: List[str],
-                                           field_usage: Dict[str, int],
+                                           signals: _QuerySignals,
                                            properties: Dict[str, Any]) -> List[str]:
         """Identify potential optimization opportunities."""
-        opportunities = []
-        
-        # Check for missing filters
-        if "bool" in query_types and "filter" not in str(query):
-            opportunities.append("Consider using filter context for non-scoring clauses")
-        
-        # Check for wildcard queries that could be optimized
-        if "wildcard" in query_types:
-            opportunities.append("Wildcard queries can be slow - consider using prefix or edge_ngram")
-        
-        # Check for sorting without filtering
-        if query.get("sort") and not any(t in query_types for t in ["term", "range", "bool"]):
-            opportunities.append("Sorting large result sets - consider adding filters")
-        
-        # Check for high cardinality aggregations
-        aggs = query.get("aggs", {})
-        if aggs and "terms" in str(aggs):
-            opportunities.append("Terms aggregations on high cardinality fields can be expensive")
+        opportunities = [rule.message for rule in _OPTIMIZATION_RULES if rule.matches(query, signals)]
         
         # Check for missing field type optimizations
-        for field_name in field_usage:
+        for field_name in signals.field_usage:
             field_config = properties.get(field_name, {})
-            field_type = field_config.get("type", "")
-            
-            if field_type == "text" and "keyword" not in str(field_config):
+            if field_config.get("type") == "text" and not _has_keyword_subfield(field_config):
                 opportunities.append(f"Consider adding keyword mapping to {field_name} for aggregations")
         
         return opportunities
@@ -427,21 +759,10 @@ class EnhancedSearchService:
         score = 100.0
         
         # Complexity penalty
-        complexity_penalties = {
-            QueryComplexity.SIMPLE: 0,
-            QueryComplexity.MEDIUM: 10,
-            QueryComplexity.COMPLEX: 25,
-            QueryComplexity.ADVANCED: 40
-        }
-        score -= complexity_penalties.get(complexity, 0)
+        score -= _COMPLEXITY_PENALTIES.get(complexity, 0)
         
         # Document count penalty
-        if estimated_docs > 1000000:
-            score -= 30
-        elif estimated_docs > 100000:
-            score -= 20
-        elif estimated_docs > 10000:
-            score -= 10
+        score -= _DOC_COUNT_PENALTIES[bisect_left(_DOC_COUNT_THRESHOLDS, estimated_docs)]
         
         # Aggregation penalty
         score -= min(agg_complexity * 5, 20)
@@ -482,29 +803,33 @@ class EnhancedSearchService:
                             query: Dict[str, Any],
                             analysis: QueryAnalysis,
                             optimization: SearchOptimization) -> Dict[str, Any]:
-        """Optimize query based on analysis and strategy."""
+        """Optimize query based on analysis and strategy.
+
+        The query is shallow-copied once here; the strategy helpers below update that
+        copy in place and must replace (not modify) any nested dict they change.
+        """
         
-        optimized = query.copy()
+        optimized = dict(query)
         
         with tracer.start_span("query_optimization") as span:
             span.set_attribute("optimization.strategy", optimization.value)
             span.set_attribute("optimization.complexity", analysis.complexity.value)
             
             if optimization == SearchOptimization.PERFORMANCE:
-                optimized = await self._optimize_for_performance(optimized, analysis)
+                optimized = self._optimize_for_performance(optimized, analysis)
             elif optimization == SearchOptimization.ACCURACY:
-                optimized = await self._optimize_for_accuracy(optimized, analysis)
+                optimized = self._optimize_for_accuracy(optimized, analysis)
             else:  # BALANCED
-                optimized = await self._optimize_balanced(optimized, analysis)
+                optimized = self._optimize_balanced(optimized, analysis)
             
             # Common optimizations
             optimized = self._apply_common_optimizations(optimized, analysis)
             
             return optimized
 
-    async def _optimize_for_performance(self, query: Dict[str, Any], analysis: QueryAnalysis) -> Dict[str, Any]:
-        """Optimize query for maximum performance."""
-        optimized = query.copy()
+    def _optimize_for_performance(self, query: Dict[str, Any], analysis: QueryAnalysis) -> Dict[str, Any]:
+        """Optimize query for maximum performance, updating it in place."""
+        optimized = query
         
         # Set reasonable size limits
         if not optimized.get("size"):
@@ -516,8 +841,7 @@ class EnhancedSearchService:
         optimized["timeout"] = "10s"
         
         # Optimize bool queries to use filter context
-        if "bool" in str(optimized):
-            optimized = self._convert_to_filter_context(optimized)
+        optimized = self._convert_to_filter_context(optimized)
         
         # Limit aggregations
         if optimized.get("aggs") and analysis.aggregation_complexity > 3:
@@ -525,9 +849,9 @@ class EnhancedSearchService:
         
         return optimized
 
-    async def _optimize_for_accuracy(self, query: Dict[str, Any], analysis: QueryAnalysis) -> Dict[str, Any]:
-        """Optimize query for maximum accuracy."""
-        optimized = query.copy()
+    def _optimize_for_accuracy(self, query: Dict[str, Any], analysis: QueryAnalysis) -> Dict[str, Any]:
+        """Optimize query for maximum accuracy, updating it in place."""
+        optimized = query
         
         # Increase size for better recall
         if not optimized.get("size") or optimized.get("size", 0) < 50:
@@ -542,9 +866,9 @@ class EnhancedSearchService:
         
         return optimized
 
-    async def _optimize_balanced(self, query: Dict[str, Any], analysis: QueryAnalysis) -> Dict[str, Any]:
-        """Apply balanced optimizations."""
-        optimized = query.copy()
+    def _optimize_balanced(self, query: Dict[str, Any], analysis: QueryAnalysis) -> Dict[str, Any]:
+        """Apply balanced optimizations, updating the query in place."""
+        optimized = query
         
         # Moderate size limit
         if not optimized.get("size"):
@@ -562,12 +886,12 @@ class EnhancedSearchService:
         return optimized
 
     def _apply_common_optimizations(self, query: Dict[str, Any], analysis: QueryAnalysis) -> Dict[str, Any]:
-        """Apply universally beneficial optimizations."""
-        optimized = query.copy()
+        """Apply universally beneficial optimizations, updating the query in place."""
+        optimized = query
         
-        # Add track_total_hits for better performance on large result sets
-        if analysis.estimated_docs > 10000:
-            optimized["track_total_hits"] = 10000
+        # Stop counting hits at 10k unless the caller asked for something else; exact
+        # totals force Elasticsearch to visit every matching document
+        optimized.setdefault("track_total_hits", 10000)
         
         # Add source filtering for large documents
         if not optimized.get("_source"):
@@ -576,15 +900,30 @@ class EnhancedSearchService:
         return optimized
 
     def _convert_to_filter_context(self, query: Dict[str, Any]) -> Dict[str, Any]:
-        """Convert appropriate clauses to filter context."""
-        # This is a simplified implementation
-        # In practice, you'd need more sophisticated logic
+        """Move non-scoring bool.must clauses into bool.filter so they can be cached.
+
+        The matched documents are unchanged; only the constant score those clauses
+        contributed is dropped.
+        """
+        inner = query.get("query")
+        if isinstance(inner, dict):
+            rewritten = _to_filter_context(inner)
+            if rewritten is not inner:
+                query["query"] = rewritten
         return query
 
     def _simplify_aggregations(self, query: Dict[str, Any]) -> Dict[str, Any]:
-        """Simplify complex aggregations for better performance."""
-        # This is a simplified implementation
-        # In practice, you'd implement specific aggregation optimizations
+        """Cap the settings that make terms and cardinality aggregations expensive.
+
+        Large terms sizes are reduced, empty-bucket collection (min_doc_count: 0) is
+        dropped and cardinality precision is held at Elasticsearch's default.
+        """
+        for key in ("aggs", "aggregations"):
+            aggs = query.get(key)
+            if isinstance(aggs, dict):
+                rewritten = _simplify_agg_tree(aggs)
+                if rewritten is not aggs:
+                    query[key] = rewritten
         return query
 
     def _enhance_text_matching(self, query: Dict[str, Any], semantic_fields: List[str]) -> Dict[str, Any]:
@@ -620,11 +959,19 @@ class EnhancedSearchService:
         )
 
     def _estimate_memory_usage(self, response: Dict[str, Any]) -> float:
-        """Estimate memory usage based on response size."""
+        """Estimate memory usage based on response size.
+
+        By default only the returned hits are measured, which is where nearly all of
+        the payload lives; set ENHANCED_SEARCH_EXACT_MEMORY_ESTIMATE=true to encode
+        the whole response instead.
+        """
         try:
-            response_str = json.dumps(response)
-            return len(response_str) / (1024 * 1024)  # Convert to MB
-        except:
+            if _EXACT_MEMORY_ESTIMATE:
+                payload = response
+            else:
+                payload = response.get("hits", {}).get("hits", [])
+            return _json_nbytes(payload) / (1024 * 1024)  # Convert to MB
+        except Exception:
             return 0.0
 
     def _extract_cpu_usage(self, profile: Dict[str, Any]) -> float:
@@ -633,12 +980,12 @@ class EnhancedSearchService:
         # For now, return a placeholder
         return 0.0
 
-    @trace_async_function("search.generate_suggestions")
-    async def _generate_suggestions(self,
-                                  index_name: str,
-                                  query: Dict[str, Any],
-                                  analysis: QueryAnalysis,
-                                  response: Dict[str, Any]) -> List[str]:
+    @trace_function("search.generate_suggestions")
+    def _generate_suggestions(self,
+                            index_name: str,
+                            query: Dict[str, Any],
+                            analysis: QueryAnalysis,
+                            response: Dict[str, Any]) -> List[str]:
         """Generate intelligent suggestions based on search results."""
         
         suggestions = []
@@ -682,12 +1029,13 @@ class EnhancedSearchService:
             if not search_terms:
                 return []
             
+            cache_key = (index_name, tuple(sorted({term.strip().lower() for term in search_terms})))
+            cached = self._related_cache.get(cache_key)
+            if cached is not None:
+                return list(cached)
+            
             # Use AI service to generate related queries
-            prompt = f"""
-            Based on the search query with terms: {', '.join(search_terms)}
-            Generate 3 related search queries that users might be interested in.
-            Return only the search terms, not full Elasticsearch queries.
-            """
+            prompt = _RELATED_QUERIES_PROMPT.format(terms=", ".join(search_terms))
             
             ai_response = await self.ai_service.generate_elasticsearch_query(
                 prompt, {}, return_debug=False
@@ -695,7 +1043,9 @@ class EnhancedSearchService:
             
             # Extract suggestions from AI response
             # This would need proper parsing of the AI response
-            return []
+            related_queries: List[str] = []
+            self._related_cache.put(cache_key, related_queries)
+            return list(related_queries)
             
         except Exception as e:
             logger.debug(f"Failed to generate related queries: {e}")
@@ -705,63 +1055,67 @@ class EnhancedSearchService:
         """Extract search terms from query for related query generation."""
         terms = []
         
-        def extract_from_dict(d: Dict[str, Any]):
+        query_body = query.get("query", {})
+        stack = [query_body] if query_body else []
+        while stack:
+            d = stack.pop()
+            children = []
             for key, value in d.items():
                 if key == "query" and isinstance(value, str):
                     terms.append(value)
-                elif key in ["match", "match_phrase"] and isinstance(value, dict):
+                elif key in _TEXT_MATCH_QUERIES and isinstance(value, dict):
                     for field_value in value.values():
                         if isinstance(field_value, str):
                             terms.append(field_value)
                         elif isinstance(field_value, dict) and "query" in field_value:
                             terms.append(field_value["query"])
                 elif isinstance(value, dict):
-                    extract_from_dict(value)
+                    children.append(value)
                 elif isinstance(value, list):
-                    for item in value:
-                        if isinstance(item, dict):
-                            extract_from_dict(item)
-        
-        query_body = query.get("query", {})
-        if query_body:
-            extract_from_dict(query_body)
+                    children.extend(item for item in value if isinstance(item, dict))
+            # Reversed so clauses are visited in the order they appear in the query
+            stack.extend(reversed(children))
         
         return terms
 
-    async def _update_performance_history(self,
-                                        index_name: str,
-                                        query: Dict[str, Any],
-                                        metrics: SearchMetrics,
-                                        analysis: QueryAnalysis):
+    def _update_performance_history(self,
+                                  index_name: str,
+                                  query: Dict[str, Any],
+                                  metrics: SearchMetrics,
+                                  analysis: QueryAnalysis):
         """Update performance history for learning and optimization."""
         
         # Create a simplified query signature for tracking
-        query_signature = self._create_query_signature(query)
+        query_signature = self._create_query_signature(query, analysis.query_types)
         
         history_key = f"{index_name}:{query_signature}"
         
-        if history_key not in self.performance_history:
-            self.performance_history[history_key] = []
+        history = self.performance_history.get(history_key)
+        if history is None:
+            # Keep only last 100 entries per query type
+            history = deque(maxlen=100)
         
-        # Store performance data point
+        # Store performance data point; the timestamp is epoch milliseconds
         data_point = {
-            "timestamp": datetime.now().isoformat(),
+            "timestamp": time.time_ns() // 1_000_000,
             "query_time_ms": metrics.query_time_ms,
             "total_hits": metrics.total_hits,
             "complexity": analysis.complexity.value,
             "performance_score": analysis.performance_score
         }
         
-        self.performance_history[history_key].append(data_point)
-        
-        # Keep only last 100 entries per query type
-        if len(self.performance_history[history_key]) > 100:
-            self.performance_history[history_key] = self.performance_history[history_key][-100:]
+        history.append(data_point)
+        # Re-inserting marks the signature as recently used and renews its TTL
+        self.performance_history.put(history_key, history)
+
+    def _create_query_signature(self, query: Dict[str, Any], query_types: Optional[List[str]] = None) -> str:
+        """Create a simplified signature for query performance tracking.
 
-    def _create_query_signature(self, query: Dict[str, Any]) -> str:
-        """Create a simplified signature for query performance tracking."""
+        Pass the query types from an existing analysis to avoid walking the query again.
+        """
         # Extract key components for signature
-        query_types = self._extract_query_types(query)
+        if query_types is None:
+            query_types = self._extract_query_types(query)
         
         # Create a normalized signature
         signature_parts = [
@@ -1,18 +1,42 @@
 # backend/services/mapping_cache_service.py
-from typing import Dict, Any, Optional, List
-from apscheduler.schedulers.asyncio import AsyncIOScheduler
+from typing import Dict, Any, Mapping, Optional, List, Tuple
 from opentelemetry import trace, metrics
 from opentelemetry.trace import SpanKind
 from opentelemetry.trace.status import Status, StatusCode
 from datetime import timedelta
+from types import MappingProxyType
+from utils.single_flight import single_flight
+import contextvars
+import hashlib
+import json
 import logging
 import asyncio
 import os
+import random
 import time
 
 logger = logging.getLogger(__name__)
 tracer = trace.get_tracer(__name__)
 
+# Refreshes compare mappings by digest so an unchanged mapping keeps its built schema;
+# orjson encodes the canonical form without building an intermediate str
+try:
+    import orjson
+
+    def _mapping_digest(mapping: Dict[str, Any]) -> str:
+        encoded = orjson.dumps(mapping, default=str, option=orjson.OPT_SORT_KEYS | orjson.OPT_NON_STR_KEYS)
+        return hashlib.blake2b(encoded, digest_size=16).hexdigest()
+except ImportError:
+    def _mapping_digest(mapping: Dict[str, Any]) -> str:
+        encoded = json.dumps(mapping, sort_keys=True, separators=(",", ":"), default=str).encode()
+        return hashlib.blake2b(encoded, digest_size=16).hexdigest()
+
+
+def _refresh_jitter_seconds() -> float:
+    """Random delay added to each scheduled refresh, from MAPPING_CACHE_REFRESH_JITTER"""
+    return max(0.0, float(os.getenv("MAPPING_CACHE_REFRESH_JITTER", "60")))
+
+
 ES_TO_JSON_TYPE = {
     'keyword': ('string', None),
     'text': ('string', None),
@@ -39,6 +63,13 @@ ES_TO_JSON_TYPE = {
     'percolator': ('string', None)
 }
 
+# Ready-made schema node per ES type; converters hand out shallow copies
+ES_TYPE_NODE = {
+    es_type: {'type': jtype, **({'format': fmt} if fmt else {})}
+    for es_type, (jtype, fmt) in ES_TO_JSON_TYPE.items()
+}
+_DEFAULT_NODE = {'type': 'string'}
+
 class MappingCacheService:
     def __init__(self, es_service):
         """Initialize the MappingCacheService with comprehensive tracing"""
@@ -55,14 +86,15 @@ class MappingCacheService:
             
             try:
                 self.es = es_service
-                self._scheduler: Optional[AsyncIOScheduler] = None
+                # Background refresh loop; replaced by a fresh task on each start
+                self._scheduler: Optional[asyncio.Task] = None
+                self._scheduler_stop: Optional[asyncio.Event] = None
                 self._mappings: Dict[str, Any] = {}
                 self._schemas: Dict[str, Any] = {}
-                self.cache: Dict[str, Dict[str, Any]] = {}
-                self.scheduler = AsyncIOScheduler()  # Legacy compatibility
+                self._mapping_hash: Dict[str, str] = {}
                 self._lock = asyncio.Lock()
                 
-                # Performance metrics
+                # Performance metrics; the counters are exported, the tallies feed get_cache_stats
                 self.meter = metrics.get_meter(__name__)
                 self.cache_hits = self.meter.create_counter(
                     "mapping_cache_hits",
@@ -72,12 +104,17 @@ class MappingCacheService:
                     "mapping_cache_misses", 
                     description="Number of cache misses"
                 )
+                self._hit_count = 0
+                self._miss_count = 0
                 
                 # Performance optimizations
                 self._refresh_in_progress = False
                 self._last_refresh_time = 0
                 self._min_refresh_interval = float(os.getenv("MIN_REFRESH_INTERVAL", "60"))  # seconds
                 self._concurrent_requests = {}  # Deduplication for concurrent requests
+                # Caps how many refresh batches hit Elasticsearch at once
+                self._refresh_concurrency = max(1, int(os.getenv("MAPPING_REFRESH_CONCURRENCY", "4")))
+                self._refresh_semaphore = asyncio.Semaphore(self._refresh_concurrency)
                 
                 # Initialization status tracking
                 self._initialization_status = {
@@ -122,14 +159,34 @@ class MappingCacheService:
                 init_span.record_exception(e)
                 raise
 
+    def _start_refresh_loop(self, interval_seconds: float, jitter_seconds: float = 0.0):
+        """Run _periodic_refresh as a task detached from the caller's trace context"""
+        self._scheduler_stop = asyncio.Event()
+        # A fresh context keeps each scheduled refresh a root span rather than a
+        # child of whatever span (e.g. application startup) started the scheduler
+        self._scheduler = asyncio.get_running_loop().create_task(
+            self._periodic_refresh(interval_seconds, jitter_seconds),
+            name="mapping_cache_refresh",
+            context=contextvars.Context()
+        )
+
+    def _record_hit(self):
+        self.cache_hits.add(1)
+        self._hit_count += 1
+
+    def _record_miss(self):
+        self.cache_misses.add(1)
+        self._miss_count += 1
+
+    def _scheduler_running(self) -> bool:
+        return self._scheduler is not None and not self._scheduler.done()
+
     async def start_scheduler(self):
         """Start the background scheduler for cache updates (blocking)"""
         if self._scheduler:
             return
-        self._scheduler = AsyncIOScheduler()
         # refresh every 5 minutes
-        self._scheduler.add_job(self.refresh_all, 'interval', minutes=5)
-        self._scheduler.start()
+        self._start_refresh_loop(5 * 60, _refresh_jitter_seconds())
         # initial load (blocks startup)
         try:
             await self.refresh_all()
@@ -159,30 +216,20 @@ class MappingCacheService:
                 
             try:
                 logger.info("🚀 Initializing mapping cache scheduler (async mode)...")
-                self._scheduler = AsyncIOScheduler()
                 
                 # Configure scheduler settings
                 refresh_interval = int(os.getenv("MAPPING_CACHE_REFRESH_INTERVAL", "5"))
-                logger.info(f"📅 Setting cache refresh interval to {refresh_interval} minutes")
+                refresh_jitter = _refresh_jitter_seconds()
+                logger.info(f"📅 Setting cache refresh interval to {refresh_interval} minutes (+ up to {refresh_jitter:.0f}s jitter)")
                 
                 scheduler_span.set_attributes({
                     "mapping_cache.refresh_interval_minutes": refresh_interval,
+                    "mapping_cache.refresh_jitter_seconds": refresh_jitter,
                     "mapping_cache.job_id": "mapping_cache_refresh"
                 })
                 
-                # Add the scheduled job with error handling
-                self._scheduler.add_job(
-                    self._safe_refresh_all,  # Wrapper with error handling 
-                    'interval', 
-                    minutes=refresh_interval,
-                    id='mapping_cache_refresh',
-                    name='Mapping Cache Refresh',
-                    replace_existing=True,
-                    max_instances=1  # Prevent overlapping refreshes
-                )
-                
-                # Start the scheduler
-                self._scheduler.start()
+                # Start the refresh loop; it runs one refresh at a time, so refreshes never overlap
+                self._start_refresh_loop(refresh_interval * 60, refresh_jitter)
                 self._initialization_status["scheduler_started"] = True
                 
                 initialization_time = time.time() - start_time
@@ -272,12 +319,12 @@ class MappingCacheService:
             stop_start_time = time.time()
             logger.info("🛑 Stopping mapping cache scheduler...")
             
-            # Check if scheduler is currently running jobs
-            running_jobs = self._scheduler.get_jobs()
-            if running_jobs:
-                logger.info(f"⏳ Waiting for {len(running_jobs)} running jobs to complete...")
+            # Let a refresh that is already running finish before the loop exits
+            if self._refresh_in_progress:
+                logger.info("⏳ Waiting for the running cache refresh to complete...")
             
-            self._scheduler.shutdown(wait=True)
+            self._scheduler_stop.set()
+            await self._scheduler
             self._scheduler = None
             
             stop_duration = time.time() - stop_start_time
@@ -289,144 +336,37 @@ class MappingCacheService:
             # Force cleanup
             try:
                 if self._scheduler:
-                    self._scheduler.shutdown(wait=False)
+                    self._scheduler.cancel()
                     self._scheduler = None
                 logger.info("🔧 Force stopped mapping cache scheduler")
             except Exception as force_error:
                 logger.error(f"❌ Force stop also failed: {force_error}")
                 self._scheduler = None
 
-    def get_cache_stats(self) -> Dict[str, Any]:
-        """Get comprehensive cache statistics for monitoring/app.state"""
-        current_time = time.time()
-        return {
-            **self._stats,
-            "refresh_in_progress": self._refresh_in_progress,
-            "cache_size_mb": self._stats.get("cache_size_bytes", 0) / 1024 / 1024,
-            "uptime_seconds": current_time - (self._initialization_status.get("initialization_time", current_time) or current_time),
-            "scheduler_running": self._scheduler is not None and self._scheduler.running,
-            "initialization_status": self._initialization_status,
-            "time_since_last_refresh": current_time - self._last_refresh_time if self._last_refresh_time > 0 else None,
-            "concurrent_requests": len(self._concurrent_requests),
-            "cache_hit_ratio": getattr(self, '_cache_hit_ratio', None),  # Will be calculated if available
-        }
-
-    def get_initialization_status(self) -> Dict[str, Any]:
-        """Get detailed initialization status for debugging"""
-        return {
-            **self._initialization_status,
-            "scheduler_running": self._scheduler is not None and self._scheduler.running,
-            "current_stats": self.get_cache_stats()
-        }
-
-    async def initialize_async(self) -> Dict[str, Any]:
-        """Complete async initialization with scheduler start and initial refresh"""
-        with tracer.start_as_current_span(
-            "mapping_cache_service.initialize_async",
-            kind=SpanKind.INTERNAL
-        ) as init_span:
-            logger.info("🚀 Performing complete mapping cache service initialization (async)...")
-            init_start_time = time.time()
-            
-            try:
-                # Start the scheduler
-                await self.start_scheduler_async()
-                
-                # Perform initial refresh
-                logger.info("🔄 Performing initial cache refresh...")
-                await self.refresh_all()
-                
-                init_duration = time.time() - init_start_time
-                self._initialization_status["complete_initialization_time"] = init_duration
-                
-                status = self.get_initialization_status()
-                
-                init_span.set_attributes({
-                    "mapping_cache.complete_init_duration_ms": init_duration * 1000,
-                    "mapping_cache.scheduler_started": status["scheduler_running"],
-                    "mapping_cache.initial_refresh_completed": status["initial_refresh_completed"],
-                    "mapping_cache.total_indices": self._stats["total_indices"]
-                })
-                
-                logger.info(f"✅ Mapping cache service fully initialized in {init_duration:.3f}s")
-                logger.info(f"📊 Ready with {self._stats['cached_mappings']} cached mappings")
-                init_span.set_status(StatusCode.OK)
-                
-                return status
-                
-            except Exception as e:
-                init_duration = time.time() - init_start_time
-                error_msg = f"Mapping cache service async initialization failed after {init_duration:.3f}s: {e}"
-                logger.error(f"❌ {error_msg}")
-                
-                init_span.set_status(Status(StatusCode.ERROR, error_msg))
-                init_span.record_exception(e)
-                raise
-
-    def initialize_sync(self) -> Dict[str, Any]:
-        """Complete sync initialization (legacy support) - limited functionality"""
-        with tracer.start_as_current_span(
-            "mapping_cache_service.initialize_sync",
-            kind=SpanKind.INTERNAL
-        ) as init_span:
-            logger.info("🚀 Performing mapping cache service sync initialization (limited)...")
-            init_start_time = time.time()
-            
-            try:
-                # Note: Cannot start async scheduler in sync mode
-                logger.warning("⚠️ Sync initialization mode - scheduler will not be started")
-                
-                init_duration = time.time() - init_start_time
-                self._initialization_status["complete_initialization_time"] = init_duration
-                self._initialization_status["warnings"].append("Sync initialization - scheduler not started")
-                
-                status = self.get_initialization_status()
-                
-                init_span.set_attributes({
-                    "mapping_cache.complete_init_duration_ms": init_duration * 1000,
-                    "mapping_cache.sync_mode": True,
-                    "mapping_cache.scheduler_started": False
-                })
-                
-                logger.info(f"✅ Mapping cache service initialized in sync mode in {init_duration:.3f}s")
-                logger.warning("⚠️ Scheduler not started in sync mode - use async initialization for full functionality")
-                init_span.set_status(StatusCode.OK)
-                
-                return status
-                
-            except Exception as e:
-                init_duration = time.time() - init_start_time
-                error_msg = f"Mapping cache service sync initialization failed after {init_duration:.3f}s: {e}"
-                logger.error(f"❌ {error_msg}")
-                
-                init_span.set_status(Status(StatusCode.ERROR, error_msg))
-                init_span.record_exception(e)
-                raise
-
-    async def refresh_cache(self):
-        """Public method to trigger cache refresh (alias for refresh_all)"""
-        return await self.refresh_all()
     def get_cache_stats(self) -> Dict[str, Any]:
         """Get cache statistics for monitoring/app.state (safe single implementation)"""
         current_time = time.time()
+        lookups = self._hit_count + self._miss_count
         uptime_reference = self._initialization_status.get("initialization_time") or current_time
         return {
             **self._stats,
             "refresh_in_progress": getattr(self, '_refresh_in_progress', False),
             "cache_size_mb": self._stats.get("cache_size_bytes", 0) / 1024 / 1024,
             "uptime_seconds": current_time - uptime_reference,
-            "scheduler_running": self._scheduler is not None and getattr(self._scheduler, 'running', False),
+            "scheduler_running": self._scheduler_running(),
             "initialization_status": self._initialization_status,
             "time_since_last_refresh": (current_time - getattr(self, '_last_refresh_time', 0)) if getattr(self, '_last_refresh_time', 0) and self._last_refresh_time > 0 else None,
             "concurrent_requests": len(getattr(self, '_concurrent_requests', {})),
-            "cache_hit_ratio": getattr(self, '_cache_hit_ratio', None),
+            "cache_hits": self._hit_count,
+            "cache_misses": self._miss_count,
+            "cache_hit_ratio": self._hit_count / lookups if lookups else None,
         }
 
     def get_initialization_status(self) -> Dict[str, Any]:
         """Get detailed initialization status for debugging"""
         return {
             **self._initialization_status,
-            "scheduler_running": self._scheduler is not None and self._scheduler.running,
+            "scheduler_running": self._scheduler_running(),
             "current_stats": self.get_cache_stats()
         }
 
@@ -554,6 +494,9 @@ class MappingCacheService:
             refresh_start_time = current_time
             
             try:
+                # A refresh must see the cluster as it is now, not the client's short-lived cache
+                self.es.invalidate_mapping()
+
                 # Use a local tracer for internal spans so that the module-level
                 # tracer's periodic/startup spans remain the primary tracer calls
                 # that tests patch and assert against.
@@ -573,56 +516,37 @@ class MappingCacheService:
                         "mapping_cache.timeout_seconds": indices_timeout
                     })
                 
+                # Forget indices that no longer exist (e.g. deleted daily indices) so the
+                # cache stays bounded by the current index set
+                evicted = self._evict_stale_indices(indices)
+                
                 logger.info(f"📋 Refreshing mappings for {len(indices)} indices")
                 refresh_span.set_attributes({
                     "mapping_cache.total_indices": len(indices),
+                    "mapping_cache.evicted_indices": evicted,
                     "mapping_cache.min_refresh_interval": self._min_refresh_interval
                 })
                 
                 self._stats["total_indices"] = len(indices)
                 
-                # Process indices in batches to avoid overwhelming Elasticsearch
-                batch_size = int(os.getenv("MAPPING_CACHE_BATCH_SIZE", "5"))
-                successful_refreshes = 0
-                failed_refreshes = 0
+                # Process indices in batches to avoid overwhelming Elasticsearch; each batch is
+                # one _mapping request, and a few batches run at once so large clusters don't
+                # refresh one batch at a time
+                batch_size = int(os.getenv("MAPPING_CACHE_BATCH_SIZE", "50"))
                 
                 with local_tracer.start_as_current_span("mapping_cache.batch_processing") as batch_span:
                     batch_span.set_attributes({
                         "mapping_cache.batch_size": batch_size,
-                        "mapping_cache.batch_count": (len(indices) + batch_size - 1) // batch_size
+                        "mapping_cache.batch_count": (len(indices) + batch_size - 1) // batch_size,
+                        "mapping_cache.batch_concurrency": self._refresh_concurrency
                     })
                     
-                    for batch_idx, i in enumerate(range(0, len(indices), batch_size)):
-                        batch = indices[i:i + batch_size]
-                        
-                        with local_tracer.start_as_current_span(f"mapping_cache.batch_{batch_idx}") as single_batch_span:
-                            single_batch_span.set_attributes({
-                                "mapping_cache.batch_index": batch_idx,
-                                "mapping_cache.batch_indices": batch
-                            })
-                            
-                            tasks = [self._refresh_index_with_retry(idx) for idx in batch]
-                            
-                            # Use asyncio.gather with return_exceptions=True to handle individual failures
-                            results = await asyncio.gather(*tasks, return_exceptions=True)
-                            
-                            # Count successes and failures
-                            batch_successes = 0
-                            batch_failures = 0
-                            for idx, result in zip(batch, results):
-                                if isinstance(result, Exception):
-                                    logger.error(f"❌ Failed to refresh mapping for index {idx}: {result}")
-                                    failed_refreshes += 1
-                                    batch_failures += 1
-                                else:
-                                    logger.debug(f"✅ Successfully refreshed mapping for index {idx}")
-                                    successful_refreshes += 1
-                                    batch_successes += 1
-                            
-                            single_batch_span.set_attributes({
-                                "mapping_cache.batch_successes": batch_successes,
-                                "mapping_cache.batch_failures": batch_failures
-                            })
+                    batch_results = await asyncio.gather(*(
+                        self._refresh_batch(local_tracer, batch_idx, indices[i:i + batch_size])
+                        for batch_idx, i in enumerate(range(0, len(indices), batch_size))
+                    ))
+                    successful_refreshes = sum(successes for successes, _ in batch_results)
+                    failed_refreshes = sum(failures for _, failures in batch_results)
                 
                 # Calculate cache size
                 cache_size_bytes = len(str(self._mappings).encode('utf-8')) + len(str(self._schemas).encode('utf-8'))
@@ -673,6 +597,88 @@ class MappingCacheService:
             finally:
                 self._refresh_in_progress = False
 
+    def _evict_stale_indices(self, indices: List[str]) -> int:
+        """Drop cached mappings and schemas for indices missing from the current listing"""
+        live = set(indices)
+        stale = [index for index in self._mappings.keys() | self._schemas.keys() if index not in live]
+        for index in stale:
+            self._mappings.pop(index, None)
+            self._schemas.pop(index, None)
+            self._mapping_hash.pop(index, None)
+        if stale:
+            logger.info(f"🧹 Evicted {len(stale)} indices no longer present in Elasticsearch")
+        return len(stale)
+
+    async def _refresh_batch(self, local_tracer, batch_idx: int, batch: List[str]) -> Tuple[int, int]:
+        """Refresh one batch of indices, returning (successes, failures)"""
+        async with self._refresh_semaphore:
+            with local_tracer.start_as_current_span(f"mapping_cache.batch_{batch_idx}") as single_batch_span:
+                single_batch_span.set_attributes({
+                    "mapping_cache.batch_index": batch_idx,
+                    "mapping_cache.batch_indices": batch
+                })
+                
+                # Fetch the whole batch with one _mapping request; indices it
+                # does not cover fall back to individual refreshes with retry
+                batch_mappings = await self._fetch_batch_mappings(batch)
+                stored = {}
+                for idx in batch:
+                    if idx in batch_mappings:
+                        try:
+                            self._store_mapping(idx, {idx: batch_mappings[idx]})
+                            stored[idx] = None
+                        except Exception as e:
+                            stored[idx] = e
+                
+                tasks = [self._refresh_index_with_retry(idx) for idx in batch if idx not in stored]
+                
+                # Use asyncio.gather with return_exceptions=True to handle individual failures
+                fallback_results = iter(await asyncio.gather(*tasks, return_exceptions=True))
+                results = [stored[idx] if idx in stored else next(fallback_results) for idx in batch]
+                
+                # Count successes and failures
+                batch_successes = 0
+                batch_failures = 0
+                for idx, result in zip(batch, results):
+                    if isinstance(result, Exception):
+                        logger.error(f"❌ Failed to refresh mapping for index {idx}: {result}")
+                        batch_failures += 1
+                    else:
+                        logger.debug(f"✅ Successfully refreshed mapping for index {idx}")
+                        batch_successes += 1
+                
+                single_batch_span.set_attributes({
+                    "mapping_cache.batch_successes": batch_successes,
+                    "mapping_cache.batch_failures": batch_failures
+                })
+                return batch_successes, batch_failures
+
+    async def _fetch_batch_mappings(self, indices: List[str]) -> Dict[str, Any]:
+        """Fetch mappings for a batch of indices in one request, or {} if that fails"""
+        try:
+            refresh_timeout = float(os.getenv("MAPPING_REFRESH_TIMEOUT", "20"))
+            return await asyncio.wait_for(
+                self.es.get_many_index_mappings(indices),
+                timeout=refresh_timeout
+            )
+        except Exception as e:
+            logger.debug(f"Batched mapping fetch failed for {len(indices)} indices, refreshing individually: {e}")
+            return {}
+
+    def _store_mapping(self, index: str, mapping: Dict[str, Any]):
+        """Cache a fetched mapping and the JSON Schema derived from it.
+
+        When the mapping is unchanged since the last refresh the cached objects are kept,
+        so the schema is not rebuilt and callers keyed on them stay valid.
+        """
+        digest = _mapping_digest(mapping)
+        if self._mapping_hash.get(index) == digest and index in self._mappings and index in self._schemas:
+            return
+        self._mappings[index] = mapping
+        # Build & cache JSON Schema per index
+        self._schemas[index] = self._build_json_schema_for_index(index, mapping)
+        self._mapping_hash[index] = digest
+
     async def _refresh_index_with_retry(self, index_name: str, max_retries: int = 2):
         """Refresh a single index mapping with retry logic"""
         for attempt in range(max_retries + 1):
@@ -689,26 +695,17 @@ class MappingCacheService:
                 # Don't re-raise the exception to avoid stopping the scheduler
 
     async def refresh_index(self, index: str):
-        """Refresh mapping for a single index with timeout handling"""
+        """Refresh mapping for a single index with timeout handling.
+
+        Joins a fetch already in flight for the index (from get_mapping or another
+        refresh) instead of issuing a second request.
+        """
         # Use a local tracer for inner index refresh spans so that higher-level
         # periodic/startup spans (which tests patch) remain the primary tracer calls.
         local_tracer = trace.get_tracer("mapping_cache_index")
         with local_tracer.start_as_current_span('mapping_cache.refresh_index', attributes={'index': index}):
             try:
-                async with self._lock:
-                    # Set a timeout for the entire refresh operation
-                    refresh_timeout = float(os.getenv("MAPPING_REFRESH_TIMEOUT", "20"))
-                    mapping = await asyncio.wait_for(
-                        self.es.get_index_mapping(index),
-                        timeout=refresh_timeout
-                    )
-
-                    self._mappings[index] = mapping
-                    # Build & cache JSON Schema per index
-                    schema = self._build_json_schema_for_index(index, mapping)
-                    self._schemas[index] = schema
-                    logger.debug(f"Refreshed mapping for index: {index}")
-
+                await single_flight(self._concurrent_requests, index, lambda: self._refresh_from_es(index))
             except asyncio.TimeoutError:
                 logger.warning(f"Timeout refreshing mapping for index {index}")
                 # Keep existing mapping if available
@@ -718,9 +715,24 @@ class MappingCacheService:
                 # Keep existing mapping if available
                 raise
 
-    async def get_all_mappings(self) -> Dict[str, Any]:
-        with tracer.start_as_current_span('mapping_cache.get_all_mappings'):
-            return self._mappings
+    async def _refresh_from_es(self, index: str) -> Dict[str, Any]:
+        """Fetch and store the current mapping for index, bypassing the client's cache"""
+        async with self._lock:
+            self.es.invalidate_mapping(index)
+            # Set a timeout for the entire refresh operation
+            refresh_timeout = float(os.getenv("MAPPING_REFRESH_TIMEOUT", "20"))
+            mapping = await asyncio.wait_for(
+                self.es.get_index_mapping(index),
+                timeout=refresh_timeout
+            )
+
+            self._store_mapping(index, mapping)
+            logger.debug(f"Refreshed mapping for index: {index}")
+            return self._mappings[index]
+
+    async def get_all_mappings(self) -> Mapping[str, Any]:
+        """Read-only live view of the cached mappings; copy with dict(...) to modify"""
+        return MappingProxyType(self._mappings)
 
     async def get_available_indices(self) -> List[str]:
         """Get list of available indices"""
@@ -728,11 +740,11 @@ class MappingCacheService:
             try:
                 # Try to get from cache first
                 if self._mappings:
-                    self.cache_hits.add(1)
+                    self._record_hit()
                     return list(self._mappings.keys())
                 
                 # If cache is empty, fetch from Elasticsearch
-                self.cache_misses.add(1)
+                self._record_miss()
                 indices = await self.es.list_indices()
                 return indices
             except Exception as e:
@@ -742,87 +754,77 @@ class MappingCacheService:
 
     async def get_mapping(self, index_name: str) -> Optional[Dict[str, Any]]:
         """Get mapping for a specific index with fallback to direct ES call and request deduplication"""
+        # Cache hits are a dict read; only the miss path is worth a span
+        mapping = self._mappings.get(index_name)
+        if mapping is not None:
+            self._record_hit()
+            return mapping
+
+        self._record_miss()
         with tracer.start_as_current_span('mapping_cache.get_mapping', attributes={'index': index_name}):
-            try:
-                # Try cache first
-                if index_name in self._mappings:
-                    self.cache_hits.add(1)
-                    logger.debug(f"Cache hit for index mapping: {index_name}")
-                    return self._mappings[index_name]
-                
-                # Check if there's already a concurrent request for this index
-                if index_name in self._concurrent_requests:
-                    logger.debug(f"Deduplicating concurrent request for index: {index_name}")
-                    return await self._concurrent_requests[index_name]
-                
-                # Cache miss - create new request future for deduplication
-                self.cache_misses.add(1)
-                logger.info(f"Cache miss for index mapping: {index_name}, fetching from Elasticsearch")
-                
-                # Create a future for this request to deduplicate concurrent calls
-                future = asyncio.Future()
-                self._concurrent_requests[index_name] = future
-                
-                try:
-                    async with self._lock:
-                        # Double-check pattern - another coroutine might have loaded it
-                        if index_name in self._mappings:
-                            self.cache_hits.add(1)
-                            result = self._mappings[index_name]
-                            future.set_result(result)
-                            return result
-                        
-                        # Fetch with timeout
-                        mapping_timeout = float(os.getenv("MAPPING_CACHE_FETCH_TIMEOUT", "15"))
-                        mapping = await asyncio.wait_for(
-                            self.es.get_index_mapping(index_name),
-                            timeout=mapping_timeout
-                        )
-                        
-                        # Cache the result
-                        self._mappings[index_name] = mapping
-                        schema = self._build_json_schema_for_index(index_name, mapping)
-                        self._schemas[index_name] = schema
-                        
-                        # Update stats
-                        self._stats["cached_mappings"] = len(self._mappings)
-                        self._stats["cached_schemas"] = len(self._schemas)
-                        
-                        logger.debug(f"Cached mapping for index: {index_name}")
-                        future.set_result(mapping)
-                        return mapping
-                        
-                except Exception as e:
-                    future.set_exception(e)
-                    raise
-                finally:
-                    # Clean up the concurrent request tracker
-                    self._concurrent_requests.pop(index_name, None)
-                    
-            except asyncio.TimeoutError:
-                logger.error(f"Timeout getting mapping for index {index_name}")
-                return None
-            except Exception as e:
-                logger.error(f"Error getting mapping for index {index_name}: {e}")
-                return None
+            return await self._fetch_mapping(index_name)
+
+    async def _fetch_mapping(self, index_name: str) -> Optional[Dict[str, Any]]:
+        """Get a mapping from the cache or Elasticsearch without recording a hit or miss"""
+        mapping = self._mappings.get(index_name)
+        if mapping is not None:
+            return mapping
+        try:
+            # Concurrent misses for the same index share one request
+            return await single_flight(
+                self._concurrent_requests, index_name, lambda: self._load_mapping(index_name))
+        except asyncio.TimeoutError:
+            logger.error(f"Timeout getting mapping for index {index_name}")
+            return None
+        except Exception as e:
+            logger.error(f"Error getting mapping for index {index_name}: {e}")
+            return None
+
+    async def _load_mapping(self, index_name: str) -> Dict[str, Any]:
+        """Fetch and cache the mapping for an index missing from the cache"""
+        logger.info(f"Cache miss for index mapping: {index_name}, fetching from Elasticsearch")
+
+        async with self._lock:
+            # Double-check pattern - another coroutine might have loaded it
+            if index_name in self._mappings:
+                return self._mappings[index_name]
+
+            # Fetch with timeout
+            mapping_timeout = float(os.getenv("MAPPING_CACHE_FETCH_TIMEOUT", "15"))
+            mapping = await asyncio.wait_for(
+                self.es.get_index_mapping(index_name),
+                timeout=mapping_timeout
+            )
+
+            # Cache the result
+            self._store_mapping(index_name, mapping)
+
+            # Update stats
+            self._stats["cached_mappings"] = len(self._mappings)
+            self._stats["cached_schemas"] = len(self._schemas)
+
+            logger.debug(f"Cached mapping for index: {index_name}")
+            return mapping
 
     async def get_indices(self):
-        with tracer.start_as_current_span('mapping_cache.get_indices'):
-            return list(self._mappings.keys())
+        return list(self._mappings.keys())
 
     async def get_schema(self, index: str) -> Optional[Dict[str, Any]]:
-        """Get JSON schema for an index, using cached mapping if available"""
+        """Get JSON schema for an index, using cached mapping if available.
+
+        The returned schema is the cached object shared by all callers and must not be mutated.
+        """
+        # Cache hits are a dict read; only the miss path is worth a span
+        schema = self._schemas.get(index)
+        if schema is not None:
+            self._record_hit()
+            return schema
+
         with tracer.start_as_current_span('mapping_cache.get_schema', attributes={'index': index}):
             try:
-                # Try cache first
-                if index in self._schemas:
-                    self.cache_hits.add(1)
-                    logger.debug(f"Schema cache hit for index: {index}")
-                    return self._schemas[index]
-                
                 # Schema not cached - try to get mapping (which may be cached)
-                self.cache_misses.add(1)
-                mapping = await self.get_mapping(index)
+                self._record_miss()
+                mapping = await self._fetch_mapping(index)
                 
                 if not mapping:
                     logger.warning(f"No mapping found for index: {index}")
@@ -864,8 +866,23 @@ class MappingCacheService:
 
     def _convert_properties(self, props: Dict[str, Any]) -> Dict[str, Any]:
         out: Dict[str, Any] = {}
-        for field, spec in (props or {}).items():
-            out[field] = self._convert_field(spec)
+        # Walk object levels with a worklist instead of recursing through _convert_field;
+        # each entry fills the properties dict already placed in its parent's node
+        stack = [(out, props)]
+        while stack:
+            target, level = stack.pop()
+            for field, spec in (level or {}).items():
+                properties = spec.get('properties')
+                if properties:
+                    child: Dict[str, Any] = {}
+                    target[field] = {
+                        'type': 'object',
+                        'properties': child,
+                        'additionalProperties': True
+                    }
+                    stack.append((child, properties))
+                else:
+                    target[field] = self._convert_field(spec)
         return out
 
     def _convert_field(self, spec: Dict[str, Any]) -> Dict[str, Any]:
@@ -891,24 +908,27 @@ class MappingCacheService:
                     'additionalProperties': True
                 }
             }
-        jtype, fmt = ES_TO_JSON_TYPE.get(ftype, ('string', None))
-        node: Dict[str, Any] = { 'type': jtype }
-        if fmt:
-            node['format'] = fmt
+        node: Dict[str, Any] = dict(ES_TYPE_NODE.get(ftype, _DEFAULT_NODE))
         # expose multi-fields as separate synthetic properties e.g. field.keyword
         if fields:
-            sub = {}
-            for subname, subdef in fields.items():
-                jsubtype, subfmt = ES_TO_JSON_TYPE.get(subdef.get('type'), ('string', None))
-                sub[f"{subname}"] = ({ 'type': jsubtype, **({ 'format': subfmt } if subfmt else {}) })
-            node['x-multi-fields'] = sub
+            node['x-multi-fields'] = {
+                subname: dict(ES_TYPE_NODE.get(subdef.get('type'), _DEFAULT_NODE))
+                for subname, subdef in fields.items()
+            }
         return node
 
-    async def _periodic_refresh(self):
+    async def _periodic_refresh(self, interval_seconds: float, jitter_seconds: float = 0.0):
+        """Refresh the cache every interval until the scheduler is stopped.
+
+        Each wait is extended by a random share of jitter_seconds so replicas started
+        together drift apart instead of refreshing against Elasticsearch in lockstep.
+        """
         while True:
-            with tracer.start_as_current_span("mapping_cache.refresh", kind=SpanKind.INTERNAL):
-                try:
-                    await self.refresh_all()
-                except Exception as e:
-                    logger.error(f"Error during periodic refresh: {e}")
-            await asyncio.sleep(self._min_refresh_interval)
+            delay = interval_seconds + random.uniform(0, jitter_seconds)
+            try:
+                await asyncio.wait_for(self._scheduler_stop.wait(), timeout=delay)
+                return
+            except asyncio.TimeoutError:
+                pass
+            # Errors are recorded and logged by the wrapper so the loop keeps running
+            await self._safe_refresh_all()
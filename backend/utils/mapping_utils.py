@@ -229,33 +229,42 @@ def flatten_properties(properties: Dict[str, Any], prefix: str = "") -> Dict[str
     or the inner 'properties' dict. Returns a dict mapping field names to a dict
     with at least the key 'type' representing the ES type.
     """
-    # If a full mapping with 'properties' was passed, unwrap it
-    if 'properties' in properties and isinstance(properties['properties'], dict):
-        properties = properties['properties']
+    def unwrap(props: Dict[str, Any]) -> Dict[str, Any]:
+        # If a full mapping with 'properties' was passed, unwrap it
+        if 'properties' in props and isinstance(props['properties'], dict):
+            return props['properties']
+        return props
 
     flattened: Dict[str, Any] = {}
 
-    for field_name, field_def in properties.items():
-        current_path = f"{prefix}.{field_name}" if prefix else field_name
-
-        if not isinstance(field_def, dict):
-            continue
-
-        # Get the field type
-        field_type = field_def.get('type')
-
-        if field_type:
-            # Direct field with type; wrap it for backward compatibility
-            flattened[current_path] = FieldType(field_type)
-
-        # Check for nested properties and recursively flatten
-        nested_props = field_def.get('properties')
-        if nested_props and isinstance(nested_props, dict):
-            nested_flattened = flatten_properties(nested_props, current_path)
-            flattened.update(nested_flattened)
-        elif not field_type:
-            # If no explicit type and no nested properties, classify as object
-            flattened[current_path] = FieldType('object')
+    # Depth-first with a stack of (path prefix, field iterator) so deep object
+    # mappings don't recurse; fields come out in the same order as a recursive walk
+    stack = [(prefix, iter(unwrap(properties).items()))]
+    while stack:
+        parent_path, fields = stack[-1]
+        for field_name, field_def in fields:
+            current_path = f"{parent_path}.{field_name}" if parent_path else field_name
+
+            if not isinstance(field_def, dict):
+                continue
+
+            # Get the field type
+            field_type = field_def.get('type')
+
+            if field_type:
+                # Direct field with type; wrap it for backward compatibility
+                flattened[current_path] = FieldType(field_type)
+
+            # Check for nested properties and flatten them before the remaining siblings
+            nested_props = field_def.get('properties')
+            if nested_props and isinstance(nested_props, dict):
+                stack.append((current_path, iter(unwrap(nested_props).items())))
+                break
+            elif not field_type:
+                # If no explicit type and no nested properties, classify as object
+                flattened[current_path] = FieldType('object')
+        else:
+            stack.pop()
 
     return flattened
 
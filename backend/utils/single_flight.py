@@ -0,0 +1,44 @@
+"""
+Request coalescing for concurrent async fetches of the same key.
+"""
+import asyncio
+from typing import Any, Awaitable, Callable, Dict, Hashable
+
+
+class FetchAbandoned(ConnectionError):
+    """The caller running a shared fetch was cancelled before the fetch finished."""
+
+
+async def single_flight(inflight: Dict[Hashable, asyncio.Future], key: Hashable,
+                        fetch: Callable[[], Awaitable[Any]]) -> Any:
+    """Run fetch at most once at a time per key; concurrent callers share its outcome.
+
+    The first caller for a key runs fetch and records the pending result in
+    inflight; later callers wait on it and get the same value or exception. If the
+    first caller is cancelled, its cancellation is not passed on: waiting callers
+    were not cancelled themselves, so one of them starts the fetch again.
+    """
+    while True:
+        pending = inflight.get(key)
+        if pending is None:
+            break
+        try:
+            # Shield so a cancelled waiter doesn't cancel the shared fetch
+            return await asyncio.shield(pending)
+        except FetchAbandoned:
+            continue
+
+    future = asyncio.get_running_loop().create_future()
+    inflight[key] = future
+    try:
+        result = await fetch()
+    except BaseException as e:
+        future.set_exception(e if isinstance(e, Exception) else FetchAbandoned(f"fetch for {key!r} abandoned"))
+        future.exception()  # Mark retrieved when nobody else is waiting
+        raise
+    finally:
+        if inflight.get(key) is future:
+            del inflight[key]
+
+    future.set_result(result)
+    return result
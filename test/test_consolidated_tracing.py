@@ -150,9 +150,14 @@ class TestServiceTracing:
         from services.elasticsearch_service import ElasticsearchService
         
         # Mock the elasticsearch client
-        with patch('services.elasticsearch_service.AsyncElasticsearch') as mock_es_client:
+        # Start without shared clients so the service builds one from the patched class
+        with patch('services.elasticsearch_service.AsyncElasticsearch') as mock_es_client, \
+                patch.dict('services.elasticsearch_service._SHARED_CLIENTS', clear=True), \
+                patch.dict('services.elasticsearch_service._SHARED_CLIENT_REFS', clear=True):
             mock_client = AsyncMock()
             mock_es_client.return_value = mock_client
+            # API-key clients are derived from the base client with .options()
+            mock_client.options = MagicMock(return_value=mock_client)
             mock_client.indices.get_mapping.return_value = {"test-index": {"mappings": {}}}
             
             es_service = ElasticsearchService("http://localhost:9200", "fake-key")
@@ -0,0 +1,478 @@
+#!/usr/bin/env python3
+"""
+Test ElasticsearchService request handling
+Covers batched mapping retrieval, retries, result caching and connection statistics
+"""
+
+import pytest
+import asyncio
+import os
+import sys
+from unittest.mock import AsyncMock, MagicMock
+from elastic_transport import ApiResponseMeta
+from elasticsearch import BadRequestError, ConnectionTimeout
+
+# Add the backend directory to the Python path
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'backend'))
+
+from config.settings import settings
+from services import elasticsearch_service
+from services.elasticsearch_service import ElasticsearchService
+
+
+class TestElasticsearchService:
+    """Test ElasticsearchService request paths against a mocked client"""
+
+    @pytest.fixture
+    def mock_client(self):
+        mock_client = AsyncMock()
+        mock_client.indices.get_mapping.return_value = {
+            "logs": {"mappings": {"properties": {"message": {"type": "text"}}}},
+            "metrics": {"mappings": {"properties": {"value": {"type": "long"}}}},
+        }
+        return mock_client
+
+    @pytest.fixture
+    def es_service(self, mock_client):
+        service = ElasticsearchService(url="http://localhost:9200")
+        service.client = mock_client
+        return service
+
+    @pytest.mark.asyncio
+    async def test_get_many_index_mappings_single_round_trip(self, es_service, mock_client):
+        """Several indices are fetched with one comma-separated _mapping call"""
+        mappings = await es_service.get_many_index_mappings(["logs", "metrics"])
+
+        mock_client.indices.get_mapping.assert_awaited_once_with(index="logs,metrics")
+        assert set(mappings) == {"logs", "metrics"}
+
+    @pytest.mark.asyncio
+    async def test_get_index_mapping_returns_full_response(self, es_service, mock_client):
+        """get_index_mapping keeps returning the response keyed by index name"""
+        mock_client.indices.get_mapping.return_value = {"logs": {"mappings": {}}}
+
+        mapping = await es_service.get_index_mapping("logs")
+
+        mock_client.indices.get_mapping.assert_awaited_once_with(index="logs")
+        assert mapping == {"logs": {"mappings": {}}}
+
+    @pytest.mark.asyncio
+    async def test_connection_stats_track_requests(self, es_service):
+        """Successful requests are counted and averaged"""
+        await es_service.get_index_mapping("logs")
+
+        stats = es_service.get_connection_stats()
+        assert stats["total_requests"] == 1
+        assert stats["failed_requests"] == 0
+        assert stats["avg_response_time"] >= 0
+
+    def test_connection_stats_report_percentiles(self, es_service):
+        """Response time percentiles are computed over the recent window"""
+        for ms in range(1, 101):
+            es_service._update_stats(success=True, response_time=ms / 1000)
+
+        stats = es_service.get_connection_stats()
+        assert stats["response_time_p50"] == pytest.approx(0.051)
+        assert stats["response_time_p95"] == pytest.approx(0.096)
+        assert stats["response_time_p99"] == pytest.approx(0.100)
+
+    @pytest.mark.asyncio
+    async def test_get_index_mapping_is_cached(self, es_service, mock_client):
+        """Repeated lookups within the TTL are served from the cache"""
+        await es_service.get_index_mapping("logs")
+        await es_service.get_index_mapping("logs")
+
+        assert mock_client.indices.get_mapping.await_count == 1
+
+    @pytest.mark.asyncio
+    async def test_concurrent_mapping_lookups_share_one_request(self, es_service, mock_client):
+        """Concurrent cache misses for the same index issue a single request"""
+        async def slow_mapping(index):
+            await asyncio.sleep(0.01)
+            return {index: {"mappings": {}}}
+
+        mock_client.indices.get_mapping.side_effect = slow_mapping
+
+        results = await asyncio.gather(*[es_service.get_index_mapping("logs") for _ in range(5)])
+
+        assert mock_client.indices.get_mapping.await_count == 1
+        assert all(result == {"logs": {"mappings": {}}} for result in results)
+
+    @pytest.mark.asyncio
+    async def test_cancelled_lookup_does_not_fail_waiting_callers(self, es_service, mock_client):
+        """Cancelling the caller that started a fetch leaves the callers waiting on it unaffected"""
+        started = asyncio.Event()
+
+        async def get_mapping(index):
+            if mock_client.indices.get_mapping.await_count == 1:
+                started.set()
+                await asyncio.Event().wait()
+            return {index: {"mappings": {}}}
+
+        mock_client.indices.get_mapping.side_effect = get_mapping
+
+        owner = asyncio.create_task(es_service.get_index_mapping("logs"))
+        await started.wait()
+        waiter = asyncio.create_task(es_service.get_index_mapping("logs"))
+        await asyncio.sleep(0)
+        owner.cancel()
+
+        assert await asyncio.wait_for(waiter, timeout=1) == {"logs": {"mappings": {}}}
+        assert owner.cancelled()
+        assert es_service._inflight == {}
+
+    @pytest.mark.asyncio
+    async def test_invalidate_mapping_forces_refetch(self, es_service, mock_client):
+        """Invalidated mappings are fetched again on next access"""
+        await es_service.get_index_mapping("logs")
+        es_service.invalidate_mapping("logs")
+        await es_service.get_index_mapping("logs")
+
+        assert mock_client.indices.get_mapping.await_count == 2
+
+    @pytest.mark.asyncio
+    async def test_cache_disabled_with_zero_ttl(self, mock_client, monkeypatch):
+        """ELASTICSEARCH_MAPPING_CACHE_TTL=0 disables caching"""
+        monkeypatch.setenv("ELASTICSEARCH_MAPPING_CACHE_TTL", "0")
+        service = ElasticsearchService(url="http://localhost:9200")
+        service.client = mock_client
+
+        await service.get_index_mapping("logs")
+        await service.get_index_mapping("logs")
+
+        assert mock_client.indices.get_mapping.await_count == 2
+
+    @pytest.mark.asyncio
+    async def test_list_indices_requests_only_needed_columns(self, es_service, mock_client):
+        """The index listing asks for two columns and excludes monitoring indices server-side"""
+        mock_client.cat.indices.return_value = [
+            {"index": "logs", "status": "open"},
+            {"index": ".kibana_1", "status": "open"},
+        ]
+
+        indices = await es_service.list_indices()
+
+        kwargs = mock_client.cat.indices.await_args.kwargs
+        assert kwargs["h"] == "index"
+        assert kwargs["s"] == "index"
+        assert "-.monitoring-*" in kwargs["index"].split(",")
+        assert indices == ["logs"]
+
+    @pytest.mark.asyncio
+    async def test_list_indices_excludes_dotted_names_server_side(self, es_service, mock_client, monkeypatch):
+        """Without data streams every dotted index is excluded by the index expression"""
+        monkeypatch.setattr(settings, "filter_system_indices", True)
+        monkeypatch.setattr(settings, "show_data_streams", False)
+        mock_client.cat.indices.return_value = [{"index": "logs"}]
+
+        assert await es_service.list_indices() == ["logs"]
+        assert mock_client.cat.indices.await_args.kwargs["index"] == "*,-.*"
+
+    @pytest.mark.asyncio
+    async def test_get_instance_reuses_service_until_closed(self):
+        """get_instance hands out one service per (url, api_key) until it is closed"""
+        first = await ElasticsearchService.get_instance("http://localhost:9200", "key-a")
+        assert await ElasticsearchService.get_instance("http://localhost:9200", "key-a") is first
+        assert await ElasticsearchService.get_instance("http://localhost:9200", "key-b") is not first
+
+        await first.close()
+        assert await ElasticsearchService.get_instance("http://localhost:9200", "key-a") is not first
+
+        for service in list(ElasticsearchService._instances.values()):
+            await service.close()
+
+    @pytest.mark.asyncio
+    async def test_execute_query_retries_transient_errors(self, es_service, mock_client):
+        """Searches are retried after a transient timeout"""
+        es_service._retry_base_delay = es_service._retry_max_delay = 0
+        mock_client.search.side_effect = [ConnectionTimeout("timed out"), {"hits": {"hits": []}}]
+
+        response = await es_service.execute_query("logs", {"query": {"match_all": {}}})
+
+        assert response == {"hits": {"hits": []}}
+        assert mock_client.search.await_count == 2
+
+    @pytest.mark.asyncio
+    async def test_bad_request_is_not_retried(self, es_service, mock_client):
+        """Client errors such as a malformed query fail on the first attempt"""
+        meta = ApiResponseMeta(status=400, http_version="1.1", headers={}, duration=0.0, node=None)
+        mock_client.search.side_effect = BadRequestError("parsing_exception", meta, {})
+
+        with pytest.raises(BadRequestError):
+            await es_service.execute_query("logs", {"query": {"bad": {}}})
+
+        assert mock_client.search.await_count == 1
+        assert es_service.get_connection_stats()["failed_requests"] == 1
+
+    @pytest.mark.asyncio
+    async def test_only_transport_errors_are_retried(self, es_service, mock_client):
+        """Non-transport exceptions fail on the first attempt"""
+        mock_client.search.side_effect = TypeError("not serializable")
+
+        with pytest.raises(TypeError):
+            await es_service.execute_query("logs", {"query": {"match_all": {}}})
+
+        assert mock_client.search.await_count == 1
+
+    @pytest.mark.asyncio
+    async def test_retry_settings_apply_to_the_service_loop(self, monkeypatch):
+        """Transport retries stay off; the retry env settings configure the service's own loop"""
+        monkeypatch.delenv("ELASTICSEARCH_RETRY_MAX_ATTEMPTS", raising=False)
+        monkeypatch.delenv("ELASTICSEARCH_MAPPING_MAX_ATTEMPTS", raising=False)
+        monkeypatch.setenv("ELASTICSEARCH_MAX_RETRIES", "4")
+        monkeypatch.setenv("ELASTICSEARCH_RETRY_ON_TIMEOUT", "false")
+        service = ElasticsearchService("http://retry-settings-test:9200")
+        try:
+            assert service._base_client._max_retries == 0
+            assert service._retry_max_attempts == 5
+            service.client = AsyncMock()
+            service.client.search.side_effect = ConnectionTimeout("timed out")
+            with pytest.raises(ConnectionTimeout):
+                await service.execute_query("logs", {"query": {"match_all": {}}})
+            assert service.client.search.await_count == 1
+        finally:
+            await service.close()
+
+        # Zero attempts would skip the loop and return None; at least one is always made
+        monkeypatch.setenv("ELASTICSEARCH_RETRY_MAX_ATTEMPTS", "0")
+        service = ElasticsearchService("http://retry-settings-test:9200")
+        try:
+            assert service._retry_max_attempts == 1
+        finally:
+            await service.close()
+
+    @pytest.mark.asyncio
+    async def test_response_time_excludes_earlier_attempts(self, es_service, mock_client):
+        """Stats time the successful attempt, not backoff sleeps or failed attempts"""
+        es_service._retry_base_delay = es_service._retry_max_delay = 0.05
+
+        async def search(**kwargs):
+            if mock_client.search.await_count == 1:
+                await asyncio.sleep(0.05)
+                raise ConnectionTimeout("timed out")
+            return {"hits": {"hits": []}}
+
+        mock_client.search.side_effect = search
+
+        await es_service.execute_query("logs", {"query": {"match_all": {}}})
+
+        assert es_service.get_connection_stats()["total_response_time"] < 0.05
+
+    @pytest.mark.asyncio
+    async def test_batched_mappings_warm_single_index_lookups(self, es_service, mock_client):
+        """Mappings fetched in a batch are reused by later lookups"""
+        await es_service.get_many_index_mappings(["logs", "metrics"])
+        await es_service.get_index_mapping("metrics")
+        await es_service.get_many_index_mappings(["logs", "metrics"])
+
+        mock_client.indices.get_mapping.assert_awaited_once_with(index="logs,metrics")
+
+    @pytest.mark.asyncio
+    async def test_long_index_lists_are_chunked(self, es_service, mock_client):
+        """Long index lists are split into several bounded _mapping requests"""
+        mock_client.indices.get_mapping.side_effect = lambda index: {
+            name: {"mappings": {}} for name in index.split(",")
+        }
+        names = [f"logs-{i}" for i in range(5)]
+
+        mappings = await es_service.get_many_index_mappings(names, chunk_size=2)
+
+        assert [c.kwargs["index"] for c in mock_client.indices.get_mapping.await_args_list] == [
+            "logs-0,logs-1", "logs-2,logs-3", "logs-4",
+        ]
+        assert list(mappings) == names
+
+    @pytest.mark.asyncio
+    async def test_mapping_chunks_are_fetched_concurrently(self, es_service, mock_client):
+        """Chunked _mapping requests overlap, up to the concurrency limit"""
+        in_flight = []
+        peak = 0
+
+        async def get_mapping(index):
+            nonlocal peak
+            in_flight.append(index)
+            peak = max(peak, len(in_flight))
+            await asyncio.sleep(0.01)
+            in_flight.remove(index)
+            return {name: {"mappings": {}} for name in index.split(",")}
+
+        mock_client.indices.get_mapping.side_effect = get_mapping
+        names = [f"logs-{i}" for i in range(10)]
+
+        mappings = await es_service.get_many_index_mappings(names, chunk_size=2, max_concurrency=3)
+
+        assert peak == 3
+        assert list(mappings) == names
+
+    @pytest.mark.asyncio
+    async def test_timed_out_call_is_cancelled_before_retry(self, es_service, mock_client):
+        """A call that exceeds the timeout is cancelled rather than left running"""
+        es_service._retry_base_delay = es_service._retry_max_delay = 0
+        es_service._search_timeout = 0.01
+        cancelled = []
+
+        async def search(**kwargs):
+            if cancelled:
+                return {"hits": {"hits": []}}
+            try:
+                await asyncio.sleep(10)
+            except asyncio.CancelledError:
+                cancelled.append(asyncio.current_task().get_name())
+                raise
+
+        mock_client.search.side_effect = search
+
+        response = await es_service.execute_query("logs", {"query": {"match_all": {}}})
+
+        assert response == {"hits": {"hits": []}}
+        assert cancelled == ["elasticsearch.search"]
+
+    @pytest.mark.asyncio
+    async def test_requests_waiting_for_a_slot_are_counted(self, es_service, mock_client):
+        """Calls beyond the pool size queue on the semaphore and show up in the stats"""
+        es_service._request_semaphore = asyncio.Semaphore(1)
+        release = asyncio.Event()
+
+        async def search(**kwargs):
+            await release.wait()
+            return {"hits": {"hits": []}}
+
+        mock_client.search.side_effect = search
+        queries = [asyncio.create_task(es_service.execute_query("logs", {})) for _ in range(3)]
+        await asyncio.sleep(0.01)
+
+        assert es_service.get_connection_stats()["queued_requests"] == 2
+        release.set()
+        await asyncio.gather(*queries)
+
+        stats = es_service.get_connection_stats()
+        assert stats["queued_requests"] == 0
+        assert stats["peak_queued_requests"] == 2
+
+    @pytest.mark.asyncio
+    async def test_malformed_query_rejected_without_round_trip(self, es_service, mock_client):
+        """Queries with a broken clause structure fail validation locally"""
+        malformed = {"query": {"bool": {"must": [{"match": {"title": "x"}, "term": {"tag": "y"}}]}}}
+
+        assert await es_service.validate_query("logs", malformed) is False
+        mock_client.indices.validate_query.assert_not_awaited()
+
+    @pytest.mark.asyncio
+    async def test_well_formed_query_is_validated_by_elasticsearch(self, es_service, mock_client):
+        """Queries passing the local check are still sent to Elasticsearch"""
+        query = {"query": {"bool": {"filter": [{"term": {"tag": "y"}}], "must": {"match_all": {}}}}}
+
+        assert await es_service.validate_query("logs", query) is True
+        mock_client.indices.validate_query.assert_awaited_once_with(index="logs", body={"query": query["query"]})
+
+    @pytest.mark.asyncio
+    async def test_api_key_clients_share_one_transport(self):
+        """Clients for different API keys are views over the same connection pool"""
+        service = ElasticsearchService("http://localhost:9200", "key-a")
+        try:
+            tenant_client = service.for_api_key("key-b")
+
+            assert service.client.transport is service._base_client.transport
+            assert tenant_client.transport is service._base_client.transport
+        finally:
+            await service.close()
+
+    @pytest.mark.asyncio
+    async def test_pool_size_defaults_to_concurrency_floor(self, monkeypatch, caplog):
+        """The default pool covers APP_MAX_CONCURRENT_ES; only a too-small explicit size warns"""
+        monkeypatch.delenv("ELASTICSEARCH_POOL_MAXSIZE", raising=False)
+        monkeypatch.setenv("APP_MAX_CONCURRENT_ES", "10")
+        service = ElasticsearchService("http://pool-size-test:9200")
+        try:
+            assert service.get_connection_stats()["connection_pool_size"] == 20
+            assert "below the" not in caplog.text
+        finally:
+            await service.close()
+
+        monkeypatch.setenv("ELASTICSEARCH_POOL_MAXSIZE", "5")
+        service = ElasticsearchService("http://pool-size-test:9200")
+        try:
+            assert service.get_connection_stats()["connection_pool_size"] == 20
+            assert "ELASTICSEARCH_POOL_MAXSIZE=5 is below the 20 connections" in caplog.text
+        finally:
+            await service.close()
+
+    @pytest.mark.asyncio
+    async def test_services_for_one_url_share_a_client_until_last_close(self):
+        """The shared client for a URL is only closed when its last service closes"""
+        url = "http://shared-client-test:9200"
+        first = ElasticsearchService(url)
+        second = ElasticsearchService(url, "key-a")
+        assert second._base_client is first._base_client
+        assert second._request_semaphore is first._request_semaphore
+
+        shared = first._base_client
+        shared.close = AsyncMock()
+        await first.close()
+        shared.close.assert_not_awaited()
+
+        await second.close()
+        shared.close.assert_awaited_once()
+        assert url not in elasticsearch_service._SHARED_CLIENTS
+
+    @pytest.mark.asyncio
+    async def test_client_serializes_with_orjson(self):
+        """Request and response bodies use the orjson serializer, including ES 8 compatibility mode"""
+        pytest.importorskip("orjson")
+        service = ElasticsearchService("http://orjson-serializer-test:9200")
+        try:
+            serializers = service._base_client.transport.serializers
+            for mimetype in ("application/json", "application/vnd.elasticsearch+json"):
+                assert isinstance(serializers.get_serializer(mimetype), elasticsearch_service.OrjsonSerializer)
+        finally:
+            await service.close()
+
+    def test_http2_falls_back_to_aiohttp_without_h2(self, monkeypatch):
+        """Enabling HTTP/2 without the h2 package keeps the aiohttp node"""
+        monkeypatch.setattr(elasticsearch_service, "_HTTP2_ENABLED", True)
+        monkeypatch.setattr(elasticsearch_service.importlib.util, "find_spec", lambda name: None)
+
+        assert ElasticsearchService._node_class() is elasticsearch_service.KeepAliveAiohttpHttpNode
+
+    @pytest.mark.asyncio
+    async def test_http2_node_keeps_parent_tls_checks_and_closes_both_clients(self, monkeypatch):
+        """The HTTP/2 node validates TLS like the parent node and shuts down both httpx clients"""
+        import ssl
+        from elastic_transport import NodeConfig, SecurityWarning
+
+        http1_client, http2_client = AsyncMock(), AsyncMock()
+        async_client = MagicMock(side_effect=[http1_client, http2_client])
+        monkeypatch.setattr(elasticsearch_service.httpx, "AsyncClient", async_client)
+        config = NodeConfig("https", "es.example.com", 9200, connections_per_node=20, request_timeout=5)
+
+        node = elasticsearch_service.Http2HttpxAsyncHttpNode(config)
+
+        kwargs = async_client.call_args.kwargs
+        assert kwargs["http2"] is True
+        assert kwargs["base_url"] == "https://es.example.com:9200"
+        assert kwargs["verify"].verify_mode == ssl.CERT_REQUIRED
+        assert node.client is http2_client
+        await node.close()
+        http1_client.aclose.assert_awaited_once()
+        http2_client.aclose.assert_awaited_once()
+
+        async_client.side_effect = None
+        with pytest.warns(SecurityWarning):
+            elasticsearch_service.Http2HttpxAsyncHttpNode(
+                NodeConfig("https", "es.example.com", 9200, verify_certs=False))
+        with pytest.raises(ValueError):
+            elasticsearch_service.Http2HttpxAsyncHttpNode(
+                NodeConfig("https", "es.example.com", 9200, ca_certs="/no/such/ca.pem"))
+
+    @pytest.mark.asyncio
+    async def test_execute_query_raw_sends_bytes_unchanged(self, es_service, mock_client):
+        """Pre-serialized query bodies are passed straight to the transport"""
+        body = b'{"query":{"match_all":{}}}'
+        mock_client.perform_request.return_value = {"hits": {"hits": []}}
+
+        response = await es_service.execute_query_raw("logs-*", body)
+
+        assert response == {"hits": {"hits": []}}
+        args, kwargs = mock_client.perform_request.await_args
+        assert args == ("POST", "/logs-*/_search")
+        assert kwargs["body"] is body
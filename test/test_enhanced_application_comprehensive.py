@@ -200,6 +200,16 @@ class TestEnhancedTelemetry:
             assert "***:***@" in result, f"Failed to sanitize DB connection: {input_text}"
             assert "://" in result, "Connection scheme should be preserved"
 
+    def test_data_sanitizer_plain_values_and_custom_patterns(self):
+        """Plain values pass through unchanged; custom patterns still apply to them."""
+        import re
+        assert self.sanitizer.sanitize_data("logs-app-prod") == "logs-app-prod"
+        assert self.sanitizer.sanitize_data("Find errors in payment logs") == "Find errors in payment logs"
+
+        custom = DataSanitizer()
+        custom.sensitive_patterns.append((re.compile(r"payment"), "[masked]"))
+        assert custom.sanitize_data("Find errors in payment logs") == "Find errors in [masked] logs"
+
     def test_security_aware_tracer(self):
         """Test SecurityAwareTracer functionality."""
         tracer = SecurityAwareTracer("test-service", self.tracer_provider.get_tracer("test"))
@@ -227,6 +237,18 @@ class TestEnhancedTelemetry:
         # Verify safe data was preserved
         assert attributes.get("safe_attribute") == "safe_value"
 
+    def test_security_aware_tracer_without_sdk_provider(self):
+        """Spans are skipped entirely until an SDK tracer provider is installed."""
+        tracer = SecurityAwareTracer("test-service")
+
+        with patch('middleware.enhanced_telemetry.trace.get_tracer_provider',
+                   return_value=trace.ProxyTracerProvider()):
+            with tracer.start_as_current_span("test-operation", attributes={"api_key": "sk-123"}) as span:
+                span.set_attribute("safe_attribute", "safe_value")
+
+        assert span is trace.INVALID_SPAN
+        assert self.tracer_provider.get_finished_spans() == []
+
     def test_enhanced_metrics_collection(self):
         """Test enhanced metrics collection."""
         metrics = EnhancedMetrics()
@@ -354,6 +376,148 @@ class TestEnhancedSearchService:
         assert analysis.performance_score > 0
         assert len(analysis.suggestions) > 0
     
+    @pytest.mark.asyncio
+    async def test_query_analysis_is_cached(self):
+        """Repeated analysis of the same query reuses the cached result."""
+        self.mock_es_service.get_index_mapping = AsyncMock(return_value={"test_index": {"mappings": {"properties": {}}}})
+        self.mock_es_service.client.count = AsyncMock(return_value={"count": 10})
+        
+        first = await self.search_service._analyze_query("test_index", {"query": {"match": {"title": "a"}}, "size": 5})
+        # Same query with keys in a different order
+        second = await self.search_service._analyze_query("test_index", {"size": 5, "query": {"match": {"title": "a"}}})
+        
+        assert second is first
+        assert self.mock_es_service.get_index_mapping.await_count == 1
+        assert self.mock_es_service.client.count.await_count == 1
+
+    @pytest.mark.asyncio
+    async def test_cached_analysis_refreshes_expired_count(self):
+        """An analysis cache hit re-reads the count once the shorter count TTL has passed."""
+        self.mock_es_service.get_index_mapping = AsyncMock(return_value={"test_index": {"mappings": {"properties": {}}}})
+        self.mock_es_service.client.count = AsyncMock(return_value={"count": 10})
+        query = {"query": {"match": {"title": "a"}}, "size": 5}
+
+        first = await self.search_service._analyze_query("test_index", query)
+        self.search_service._count_cache.clear()
+        self.mock_es_service.client.count.return_value = {"count": 20}
+        second = await self.search_service._analyze_query("test_index", query)
+
+        assert (first.estimated_docs, second.estimated_docs) == (10, 20)
+        assert second.field_usage is first.field_usage
+        assert self.mock_es_service.get_index_mapping.await_count == 1
+
+    @pytest.mark.asyncio
+    async def test_query_shape_reuses_structural_analysis(self):
+        """Queries differing only in search values reuse the analysis but not the count."""
+        self.mock_es_service.get_index_mapping = AsyncMock(
+            return_value={"test_index": {"mappings": {"properties": {"title": {"type": "text"}}}}})
+        counts = iter([{"count": 10}, {"count": 5000000}])
+
+        async def count(**kwargs):
+            return next(counts)
+
+        self.mock_es_service.client.count = AsyncMock(side_effect=count)
+
+        first = await self.search_service._analyze_query("test_index", {"query": {"match": {"title": "coffee"}}, "size": 5})
+        second = await self.search_service._analyze_query("test_index", {"query": {"match": {"title": "tea"}}, "size": 5})
+
+        assert self.mock_es_service.get_index_mapping.await_count == 1
+        assert (first.estimated_docs, second.estimated_docs) == (10, 5000000)
+        assert second.performance_score < first.performance_score
+        assert second.field_usage == first.field_usage
+
+        # Values outside "query" are part of the shape
+        await self.search_service._analyze_query("test_index", {"query": {"match": {"title": "tea"}}, "size": 0, "aggs": {}})
+        assert self.mock_es_service.get_index_mapping.await_count == 2
+
+    def test_query_shape_handles_deep_nesting(self):
+        """Masking query values doesn't recurse, so deeply nested queries keep their shape."""
+        from services.enhanced_search_service import _query_shape
+
+        query = leaf = {}
+        for depth in range(3000):
+            leaf["bool"] = {"must": [{"term": {"tag": "a"}}, {}]}
+            leaf = leaf["bool"]["must"][1]
+
+        node = _query_shape({"query": query})["query"]
+        for depth in range(3000):
+            assert node["bool"]["must"][0] == {"term": {"tag": "<str>"}}
+            node = node["bool"]["must"][1]
+        assert node == {}
+
+    @pytest.mark.asyncio
+    async def test_filter_suggestion_ignores_matching_text(self):
+        """Filter-context detection looks at query structure, not at search text."""
+        self.mock_es_service.get_index_mapping = AsyncMock(return_value={"test_index": {"mappings": {"properties": {}}}})
+        self.mock_es_service.client.count = AsyncMock(return_value={"count": 10})
+        
+        query = {"query": {"bool": {"must": [{"match": {"title": "coffee filter"}}]}}}
+        analysis = await self.search_service._analyze_query("test_index", query)
+        
+        assert "Consider using filter context for non-scoring clauses" in analysis.optimization_opportunities
+    
+    def test_keyword_mapping_suggestion_checks_subfields(self):
+        """Keyword suggestions depend on the mapping's multi-fields, not on its text."""
+        from services.enhanced_search_service import _walk_query
+        properties = {
+            "title": {"type": "text", "fields": {"keyword": {"type": "keyword"}}},
+            "body": {"type": "text", "analyzer": "keyword_lowercase"},
+        }
+        query = {"query": {"bool": {"filter": [{"match": {"title": "a"}}, {"match": {"body": "b"}}]}}}
+
+        opportunities = self.search_service._identify_optimization_opportunities(
+            query, _walk_query(query, properties), properties
+        )
+
+        assert opportunities == ["Consider adding keyword mapping to body for aggregations"]
+    
+    @pytest.mark.asyncio
+    async def test_mapping_and_count_requests_overlap(self):
+        """The mapping lookup and the count estimate are issued concurrently."""
+        in_flight = []
+        overlapped = []
+        
+        async def tracked(result):
+            in_flight.append(1)
+            await asyncio.sleep(0.01)
+            overlapped.append(len(in_flight) == 2)
+            return result
+        
+        async def get_index_mapping(index):
+            return await tracked({index: {"mappings": {"properties": {}}}})
+        
+        async def count(**kwargs):
+            return await tracked({"count": 3})
+        
+        self.mock_es_service.get_index_mapping = AsyncMock(side_effect=get_index_mapping)
+        self.mock_es_service.client.count = AsyncMock(side_effect=count)
+        
+        analysis = await self.search_service._analyze_query("test_index", {"query": {"match_all": {}}})
+        
+        assert analysis.estimated_docs == 3
+        assert overlapped == [True, True]
+    
+    @pytest.mark.asyncio
+    async def test_count_only_query_skips_estimate(self):
+        """Size-0 queries without aggregations don't issue a separate count request."""
+        self.mock_es_service.get_index_mapping = AsyncMock(return_value={"test_index": {"mappings": {"properties": {}}}})
+        self.mock_es_service.client.count = AsyncMock(return_value={"count": 10})
+        
+        analysis = await self.search_service._analyze_query("test_index", {"query": {"match_all": {}}, "size": 0})
+        
+        assert analysis.estimated_docs == 0
+        self.mock_es_service.client.count.assert_not_awaited()
+        
+        optimized = self.search_service._apply_common_optimizations({"size": 0}, analysis)
+        assert optimized["track_total_hits"] == 10000
+        optimized = self.search_service._apply_common_optimizations({"track_total_hits": True}, analysis)
+        assert optimized["track_total_hits"] is True
+        
+        # Aggregations may be spelled out in full; those queries still touch documents
+        estimated = await self.search_service._estimate_affected_documents(
+            "test_index", {"size": 0, "aggregations": {"by_tag": {"terms": {"field": "tag"}}}})
+        assert estimated == 10
+    
     @pytest.mark.asyncio
     async def test_search_optimization_strategies(self):
         """Test different search optimization strategies."""
@@ -382,19 +546,151 @@ class TestEnhancedSearchService:
         )
         
         # Performance optimization should reduce size
-        perf_optimized = await self.search_service._optimize_for_performance(base_query, analysis)
+        perf_optimized = self.search_service._optimize_for_performance(dict(base_query), analysis)
         assert perf_optimized["size"] <= 100
         assert "timeout" in perf_optimized
         
         # Accuracy optimization should maintain or increase size
-        acc_optimized = await self.search_service._optimize_for_accuracy(base_query, analysis)
+        acc_optimized = self.search_service._optimize_for_accuracy(dict(base_query), analysis)
         assert acc_optimized["size"] >= base_query["size"]
         
         # Balanced optimization should be middle ground
-        balanced_optimized = await self.search_service._optimize_balanced(base_query, analysis)
+        balanced_optimized = self.search_service._optimize_balanced(dict(base_query), analysis)
         assert balanced_optimized["size"] <= 200
         assert "timeout" in balanced_optimized
     
+    @pytest.mark.asyncio
+    async def test_optimize_query_leaves_input_untouched(self):
+        """Test the optimization chain works on a single copy of the caller's query."""
+        from services.enhanced_search_service import QueryAnalysis
+        query = {"query": {"match": {"title": "test"}}, "size": 500}
+        analysis = QueryAnalysis(
+            complexity=QueryComplexity.SIMPLE, estimated_docs=10, field_usage={}, query_types=["match"],
+            suggestions=[], performance_score=90.0, semantic_fields=[], aggregation_complexity=0,
+            index_coverage=0.0, optimization_opportunities=[]
+        )
+
+        optimized = await self.search_service._optimize_query(query, analysis, SearchOptimization.PERFORMANCE)
+
+        assert optimized is not query
+        assert query == {"query": {"match": {"title": "test"}}, "size": 500}
+        assert optimized["size"] == 100
+        assert optimized["track_total_hits"] == 10000
+
+    def test_filter_context_conversion(self):
+        """Test non-scoring must clauses move to filter without touching the input."""
+        import copy
+        query = {
+            "query": {
+                "bool": {
+                    "must": [
+                        {"match": {"title": "coffee"}},
+                        {"term": {"category": "tech"}},
+                        {"bool": {"must": {"range": {"score": {"gte": 1}}}}}
+                    ],
+                    "filter": {"exists": {"field": "title"}},
+                    "should": [{"match": {"content": "beans"}}]
+                }
+            }
+        }
+        original = copy.deepcopy(query)
+
+        optimized = self.search_service._convert_to_filter_context(dict(query))
+
+        assert query == original
+        bool_query = optimized["query"]["bool"]
+        assert bool_query["must"] == [
+            {"match": {"title": "coffee"}},
+            {"bool": {"filter": [{"range": {"score": {"gte": 1}}}]}}
+        ]
+        assert bool_query["filter"] == [{"exists": {"field": "title"}}, {"term": {"category": "tech"}}]
+        assert bool_query["should"] == [{"match": {"content": "beans"}}]
+
+        # Nothing to move leaves the query object as it was
+        scoring_only = {"query": {"bool": {"must": [{"match": {"title": "coffee"}}]}}}
+        assert self.search_service._convert_to_filter_context(dict(scoring_only))["query"] is scoring_only["query"]
+
+    def test_aggregation_simplification(self):
+        """Test expensive aggregation settings are capped on a copy of the query."""
+        import copy
+        query = {
+            "aggs": {
+                "by_tag": {
+                    "terms": {"field": "tag", "size": 50000, "min_doc_count": 0},
+                    "aggs": {"users": {"cardinality": {"field": "user", "precision_threshold": 40000}}}
+                },
+                "by_day": {"date_histogram": {"field": "ts", "calendar_interval": "day"}}
+            }
+        }
+        original = copy.deepcopy(query)
+
+        simplified = self.search_service._simplify_aggregations(dict(query))
+
+        assert query == original
+        by_tag = simplified["aggs"]["by_tag"]
+        assert by_tag["terms"] == {"field": "tag", "size": 1000, "min_doc_count": 1}
+        assert by_tag["aggs"]["users"]["cardinality"]["precision_threshold"] == 3000
+        assert simplified["aggs"]["by_day"] is query["aggs"]["by_day"]
+
+    @pytest.mark.asyncio
+    async def test_related_query_failure_does_not_fail_search(self):
+        """Related queries are requested even without hits, and their failure yields an empty list."""
+        self.mock_es_service.get_index_mapping = AsyncMock(return_value={"test_index": {"mappings": {"properties": {}}}})
+        self.mock_es_service.client.count = AsyncMock(return_value={"count": 0})
+        self.mock_es_service.client.search = AsyncMock(return_value={"hits": {"total": {"value": 0}, "hits": []}})
+        self.search_service._generate_related_queries = AsyncMock(side_effect=RuntimeError("ai down"))
+
+        result = await self.search_service.execute_enhanced_search("test_index", {"query": {"match": {"title": "x"}}})
+
+        assert result.related_queries == []
+        assert "Try using broader search terms" in result.suggestions
+        self.search_service._generate_related_queries.assert_awaited_once()
+
+    @pytest.mark.asyncio
+    async def test_related_queries_cached_by_terms(self):
+        """Queries with the same search terms share one AI call."""
+        self.mock_ai_service.generate_elasticsearch_query = AsyncMock(return_value={})
+
+        await self.search_service._generate_related_queries(
+            "test_index", {"query": {"match": {"title": "Coffee"}}}, {})
+        await self.search_service._generate_related_queries(
+            "test_index", {"query": {"bool": {"must": [{"match": {"content": "coffee "}}]}}}, {})
+        await self.search_service._generate_related_queries(
+            "test_index", {"query": {"match": {"title": "tea"}}}, {})
+
+        assert self.mock_ai_service.generate_elasticsearch_query.await_count == 2
+
+    @pytest.mark.asyncio
+    async def test_performance_history_is_bounded(self):
+        """Test performance history keeps a capped number of points and signatures."""
+        from services.enhanced_search_service import QueryAnalysis, SearchMetrics, _LRUCache
+        analysis = QueryAnalysis(
+            complexity=QueryComplexity.SIMPLE, estimated_docs=10, field_usage={}, query_types=[],
+            suggestions=[], performance_score=90.0, semantic_fields=[], aggregation_complexity=0,
+            index_coverage=0.0, optimization_opportunities=[]
+        )
+        metrics = SearchMetrics(
+            query_time_ms=5, total_hits=1, max_score=1.0, shard_info={}, cache_usage={},
+            memory_usage_mb=0.0, cpu_usage_percent=0.0
+        )
+        self.search_service.performance_history = _LRUCache(maxsize=2)
+
+        for _ in range(150):
+            self.search_service._update_performance_history("idx", {"size": 1}, metrics, analysis)
+        for size in (2, 3):
+            self.search_service._update_performance_history("idx", {"size": size}, metrics, analysis)
+
+        assert len(self.search_service.performance_history) == 2
+        assert self.search_service.performance_history.get(
+            f"idx:{self.search_service._create_query_signature({'size': 1})}") is None
+        history = self.search_service.performance_history.get(
+            f"idx:{self.search_service._create_query_signature({'size': 3})}")
+        assert len(history) == 1
+
+        self.search_service._update_performance_history("idx", {"size": 3}, metrics, analysis)
+        assert len(history) == 2
+        assert isinstance(history[-1]["timestamp"], int)
+
     def test_query_complexity_determination(self):
         """Test query complexity classification."""
         # Simple query
@@ -460,6 +756,27 @@ class TestEnhancedSearchService:
         assert field_usage["title"] >= 1
         assert field_usage["category"] >= 1
 
+    def test_performance_score_doc_count_thresholds(self):
+        """Test document count penalties apply only above each threshold."""
+        def score(docs):
+            return self.search_service._calculate_performance_score(QueryComplexity.SIMPLE, docs, 0, 10)
+
+        assert score(-1) == score(10000) == 100.0
+        assert score(10001) == score(100000) == 90.0
+        assert score(100001) == score(1000000) == 80.0
+        assert score(1000001) == 70.0
+        assert self.search_service._calculate_performance_score(QueryComplexity.ADVANCED, 0, 0, 10) == 60.0
+
+    def test_memory_estimate_measures_hits(self):
+        """Test memory estimation sizes the returned hits rather than the whole response."""
+        hits = [{"_id": str(i), "_source": {"body": "x" * 1024}} for i in range(64)]
+        response = {"took": 3, "_shards": {"total": 1}, "hits": {"total": {"value": 64}, "hits": hits}}
+
+        estimate = self.search_service._estimate_memory_usage(response)
+
+        assert 64 * 1024 / (1024 * 1024) < estimate < 80 * 1024 / (1024 * 1024)
+        assert self.search_service._estimate_memory_usage({}) < 0.001
+
 
 class TestApplicationIntegration:
     """Integration tests for the complete application stack."""
@@ -0,0 +1,323 @@
+#!/usr/bin/env python3
+"""
+Test MappingCacheService schema building
+Covers the mapping to JSON Schema conversion used by chat and query routes
+"""
+
+import pytest
+import asyncio
+import os
+import sys
+from unittest.mock import AsyncMock, MagicMock, patch
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+# Add the backend directory to the Python path
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'backend'))
+
+from services.mapping_cache_service import MappingCacheService, ES_TYPE_NODE
+
+
+class TestMappingSchemaBuilder:
+    """Test JSON Schema generation from Elasticsearch mappings"""
+
+    def setup_method(self):
+        self.service = MappingCacheService(MagicMock())
+
+    def test_field_types_and_multi_fields(self):
+        mapping = {"logs": {"mappings": {"properties": {
+            "message": {"type": "text", "fields": {"keyword": {"type": "keyword"}, "raw": {}}},
+            "@timestamp": {"type": "date"},
+            "bytes": {"type": "long"},
+            "custom": {"type": "unknown_plugin_type"},
+            "host": {"properties": {"ip": {"type": "ip"}}},
+            "events": {"type": "nested"},
+        }}}}
+
+        schema = self.service._build_json_schema_for_index("logs", mapping)
+        props = schema["properties"]
+
+        assert schema["$id"] == "urn:es:logs"
+        assert props["message"] == {
+            "type": "string",
+            "x-multi-fields": {"keyword": {"type": "string"}, "raw": {"type": "string"}},
+        }
+        assert props["@timestamp"] == {"type": "string", "format": "date-time"}
+        assert props["bytes"] == {"type": "integer"}
+        assert props["custom"] == {"type": "string"}
+        assert props["host"] == {
+            "type": "object",
+            "properties": {"ip": {"type": "string"}},
+            "additionalProperties": True,
+        }
+        assert props["events"]["type"] == "array"
+        assert props["events"]["items"]["properties"] == {}
+
+    def test_nodes_are_not_shared_with_type_table(self):
+        mapping = {"logs": {"mappings": {"properties": {"a": {"type": "date"}, "b": {"type": "date"}}}}}
+
+        props = self.service._build_json_schema_for_index("logs", mapping)["properties"]
+        props["a"]["format"] = "date"
+
+        assert props["b"] == {"type": "string", "format": "date-time"}
+        assert ES_TYPE_NODE["date"] == {"type": "string", "format": "date-time"}
+
+    def test_unchanged_mapping_keeps_built_schema(self):
+        def mapping(field_type):
+            return {"logs": {"mappings": {"properties": {"message": {"type": field_type}}}}}
+
+        self.service._store_mapping("logs", mapping("text"))
+        cached_mapping = self.service._mappings["logs"]
+        cached_schema = self.service._schemas["logs"]
+
+        # An equal mapping fetched on the next refresh reuses the cached objects
+        self.service._store_mapping("logs", mapping("text"))
+        assert self.service._mappings["logs"] is cached_mapping
+        assert self.service._schemas["logs"] is cached_schema
+
+        self.service._store_mapping("logs", mapping("keyword"))
+        assert self.service._mappings["logs"] is not cached_mapping
+        assert self.service._schemas["logs"]["properties"]["message"] == {"type": "string"}
+        assert self.service._schemas["logs"] is not cached_schema
+
+    def test_deeply_nested_objects_do_not_recurse(self):
+        props = leaf = {}
+        for depth in range(3000):
+            leaf["child"] = {"properties": {}}
+            leaf = leaf["child"]["properties"]
+        leaf["value"] = {"type": "long"}
+
+        node = {"properties": self.service._convert_properties(props)}
+        for depth in range(3000):
+            node = node["properties"]["child"]
+            assert node["type"] == "object"
+        assert node["properties"]["value"] == {"type": "integer"}
+
+    async def test_cache_hits_skip_tracing(self):
+        mapping = {"logs": {"mappings": {"properties": {"message": {"type": "text"}}}}}
+        self.service._store_mapping("logs", mapping)
+
+        with patch("services.mapping_cache_service.tracer") as mock_tracer:
+            assert await self.service.get_mapping("logs") is mapping
+            assert await self.service.get_schema("logs") is self.service._schemas["logs"]
+            assert await self.service.get_indices() == ["logs"]
+            all_mappings = await self.service.get_all_mappings()
+
+        mock_tracer.start_as_current_span.assert_not_called()
+        assert all_mappings["logs"] is mapping
+        stats = self.service.get_cache_stats()
+        assert (stats["cache_hits"], stats["cache_misses"], stats["cache_hit_ratio"]) == (2, 0, 1.0)
+        with pytest.raises(TypeError):
+            all_mappings["other"] = {}
+
+
+class TestMappingRefresh:
+    """Test full cache refreshes against a mocked Elasticsearch service"""
+
+    async def test_refresh_all_bounds_concurrent_batches(self, monkeypatch):
+        monkeypatch.setenv("MAPPING_CACHE_BATCH_SIZE", "2")
+        monkeypatch.setenv("MAPPING_REFRESH_CONCURRENCY", "3")
+        indices = [f"logs-{i}" for i in range(20)]
+        in_flight = 0
+        peak = 0
+
+        async def get_many_index_mappings(names):
+            nonlocal in_flight, peak
+            in_flight += 1
+            peak = max(peak, in_flight)
+            await asyncio.sleep(0.01)
+            in_flight -= 1
+            # One index is missing from the batched response and is refreshed on its own
+            return {name: {"mappings": {"properties": {}}} for name in names if name != "logs-7"}
+
+        es = MagicMock()
+        es.list_indices = AsyncMock(return_value=indices)
+        es.get_many_index_mappings = get_many_index_mappings
+        es.get_index_mapping = AsyncMock(return_value={"logs-7": {"mappings": {"properties": {}}}})
+        service = MappingCacheService(es)
+        service._min_refresh_interval = 0
+
+        await service.refresh_all()
+
+        assert peak == 3
+        assert sorted(service._schemas) == sorted(indices)
+        es.get_index_mapping.assert_awaited_once_with("logs-7")
+        assert service._stats["refresh_errors"] == 0
+
+    async def test_refresh_and_lookup_share_one_fetch(self):
+        mapping = {"logs": {"mappings": {"properties": {"message": {"type": "text"}}}}}
+        release = asyncio.Event()
+
+        async def get_index_mapping(index):
+            await release.wait()
+            return mapping
+
+        es = MagicMock()
+        es.get_index_mapping = AsyncMock(side_effect=get_index_mapping)
+        service = MappingCacheService(es)
+
+        refresh = asyncio.create_task(service.refresh_index("logs"))
+        await asyncio.sleep(0)
+        lookup = asyncio.create_task(service.get_mapping("logs"))
+        second_refresh = asyncio.create_task(service.refresh_index("logs"))
+        await asyncio.sleep(0)
+        release.set()
+        await asyncio.gather(refresh, second_refresh)
+
+        assert await lookup is mapping
+        es.get_index_mapping.assert_awaited_once_with("logs")
+        assert service._concurrent_requests == {}
+
+    async def test_failed_refresh_is_raised_to_joined_callers(self):
+        release = asyncio.Event()
+
+        async def get_index_mapping(index):
+            await release.wait()
+            raise RuntimeError("cluster unavailable")
+
+        es = MagicMock()
+        es.get_index_mapping = AsyncMock(side_effect=get_index_mapping)
+        service = MappingCacheService(es)
+
+        refresh = asyncio.create_task(service.refresh_index("logs"))
+        await asyncio.sleep(0)
+        joined = asyncio.create_task(service.refresh_index("logs"))
+        await asyncio.sleep(0)
+        release.set()
+
+        for task in (refresh, joined):
+            with pytest.raises(RuntimeError):
+                await task
+        es.get_index_mapping.assert_awaited_once()
+
+    async def test_cancelled_owner_does_not_cancel_joined_callers(self):
+        mapping = {"logs": {"mappings": {"properties": {"message": {"type": "text"}}}}}
+        started = asyncio.Event()
+        calls = 0
+
+        async def get_index_mapping(index):
+            nonlocal calls
+            calls += 1
+            if calls == 1:
+                started.set()
+                await asyncio.Event().wait()
+            return mapping
+
+        es = MagicMock()
+        es.get_index_mapping = AsyncMock(side_effect=get_index_mapping)
+        service = MappingCacheService(es)
+
+        owner = asyncio.create_task(service.get_mapping("logs"))
+        await started.wait()
+        joined_lookup = asyncio.create_task(service.get_mapping("logs"))
+        joined_refresh = asyncio.create_task(service.refresh_index("logs"))
+        await asyncio.sleep(0)
+        owner.cancel()
+
+        with pytest.raises(asyncio.CancelledError):
+            await owner
+        # The joined callers weren't cancelled, so one of them fetches again for both
+        assert await asyncio.wait_for(joined_lookup, timeout=1) is mapping
+        await asyncio.wait_for(joined_refresh, timeout=1)
+        assert es.get_index_mapping.await_count == 2
+        assert service._concurrent_requests == {}
+
+    async def test_each_lookup_records_one_outcome(self):
+        mapping = {"logs": {"mappings": {"properties": {"message": {"type": "text"}}}}}
+        es = MagicMock()
+        es.get_index_mapping = AsyncMock(return_value=mapping)
+        service = MappingCacheService(es)
+
+        def counts():
+            stats = service.get_cache_stats()
+            return stats["cache_hits"], stats["cache_misses"]
+
+        assert await service.get_schema("logs") is not None
+        assert counts() == (0, 1)
+        await service.get_mapping("logs")
+        assert counts() == (1, 1)
+
+        # Concurrent misses each count once, whichever of them fetches
+        service._mappings.clear()
+        service._schemas.clear()
+        await asyncio.gather(service.get_mapping("logs"), service.get_mapping("logs"))
+        assert counts() == (1, 3)
+        assert es.get_index_mapping.await_count == 2
+
+    async def test_refresh_all_evicts_deleted_indices(self):
+        mapping = {"mappings": {"properties": {"message": {"type": "text"}}}}
+        es = MagicMock()
+        es.list_indices = AsyncMock(return_value=["logs-2"])
+        es.get_many_index_mappings = AsyncMock(return_value={"logs-2": mapping})
+        service = MappingCacheService(es)
+        service._min_refresh_interval = 0
+        service._store_mapping("logs-1", {"logs-1": mapping})
+
+        await service.refresh_all()
+
+        assert list(service._mappings) == ["logs-2"]
+        assert list(service._schemas) == ["logs-2"]
+        assert list(service._mapping_hash) == ["logs-2"]
+
+    async def test_refresh_all_fetches_small_clusters_in_one_request(self, monkeypatch):
+        monkeypatch.delenv("MAPPING_CACHE_BATCH_SIZE", raising=False)
+        indices = [f"logs-{i}" for i in range(30)]
+        es = MagicMock()
+        es.list_indices = AsyncMock(return_value=indices)
+        es.get_many_index_mappings = AsyncMock(
+            return_value={name: {"mappings": {"properties": {}}} for name in indices})
+        es.get_index_mapping = AsyncMock()
+        service = MappingCacheService(es)
+        service._min_refresh_interval = 0
+
+        await service.refresh_all()
+
+        es.get_many_index_mappings.assert_awaited_once_with(indices)
+        es.get_index_mapping.assert_not_called()
+        assert len(service._schemas) == 30
+
+    async def test_forced_refresh_bypasses_client_cache(self):
+        from services.elasticsearch_service import ElasticsearchService
+
+        client = AsyncMock()
+        client.cat.indices.return_value = [{"index": "logs"}]
+        client.indices.get_mapping.return_value = {"logs": {"mappings": {"properties": {}}}}
+        es = ElasticsearchService(url="http://localhost:9200")
+        es.client = client
+        service = MappingCacheService(es)
+        service._min_refresh_interval = 0
+
+        await service.refresh_all()
+        client.indices.get_mapping.return_value = {
+            "logs": {"mappings": {"properties": {"message": {"type": "text"}}}}}
+        await service.refresh_cache()
+        assert service._schemas["logs"]["properties"] == {"message": {"type": "string"}}
+
+        await service.refresh_index("logs")
+
+        assert client.cat.indices.await_count == 2
+        assert client.indices.get_mapping.await_count == 3
+
+
+class TestMappingRoute:
+    """Test the mapping endpoint served from the cache"""
+
+    def test_mapping_endpoint_returns_fields_and_raw_mapping(self):
+        from routers.query import router
+
+        mapping = {"logs": {"mappings": {"properties": {"message": {"type": "text"}}}}}
+        service = MappingCacheService(MagicMock())
+        service._store_mapping("logs", mapping)
+        app = FastAPI()
+        app.include_router(router)
+        app.state.mapping_cache_service = service
+
+        response = TestClient(app).get("/mapping/logs")
+
+        assert response.status_code == 200
+        assert response.json() == {
+            "index_name": "logs",
+            "fields": {"message": {"type": "string"}},
+            "is_long": False,
+            "raw_mapping": mapping,
+        }
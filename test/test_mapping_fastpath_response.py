@@ -45,3 +45,23 @@ def test_mapping_fastpath_returns_structured_mapping():
     assert mapping_resp is not None, "mapping_response not present in debug_info"
     assert isinstance(mapping_resp.get('fields'), list)
 
+
+
+def test_mapping_summary_reused_until_mapping_changes():
+    repo_root = os.path.dirname(os.path.dirname(__file__))
+    backend_dir = os.path.join(repo_root, 'backend')
+    if backend_dir not in sys.path:
+        sys.path.insert(0, backend_dir)
+
+    from routers.chat import _summarize_mapping
+
+    mapping = {"idx": {"mappings": {"properties": {"title": {"type": "text"}}}}}
+    first = _summarize_mapping("idx", mapping)
+    assert first[1] == 1
+    assert _summarize_mapping("idx", mapping) is first
+
+    # A refreshed mapping is a new object and gets a new summary
+    refreshed = {"idx": {"mappings": {"properties": {"title": {"type": "text"}, "tag": {"type": "keyword"}}}}}
+    second = _summarize_mapping("idx", refreshed)
+    assert second is not first
+    assert second[1] == 2
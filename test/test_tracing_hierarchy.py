@@ -34,6 +34,9 @@ class TestTracingHierarchy:
         assert status["service_initialized"] is True
         assert status["scheduler_started"] is False
         assert status["initial_refresh_completed"] is False
+        # The scheduler is only created when it is started
+        assert service._scheduler is None
+        assert not hasattr(service, "scheduler")
 
     @patch('services.mapping_cache_service.tracer')
     async def test_periodic_refresh_creates_root_span(self, mock_tracer):
@@ -90,10 +93,35 @@ class TestTracingHierarchy:
             status = service.get_initialization_status()
             assert status["scheduler_started"] is True
             assert service._scheduler is not None
-            assert service._scheduler.running is True
+            assert status["scheduler_running"] is True
             
             # Stop scheduler to clean up
             await service.stop_scheduler()
+            assert service._scheduler is None
+            assert service.get_cache_stats()["scheduler_running"] is False
+            mock_refresh.assert_not_called()
+
+    async def test_scheduled_refreshes_run_until_stopped(self):
+        """Test the refresh loop runs periodic refreshes outside the caller's span"""
+        service = MappingCacheService(self.mock_es_service)
+        refreshed = asyncio.Event()
+        parent_spans = []
+
+        async def refresh():
+            parent_spans.append(trace.get_current_span())
+            refreshed.set()
+
+        startup_span = trace.NonRecordingSpan(trace.SpanContext(trace_id=1, span_id=1, is_remote=False))
+        with patch.object(service, '_safe_refresh_all', side_effect=refresh), \
+                patch('services.mapping_cache_service.random.uniform', return_value=0.005) as jitter:
+            with trace.use_span(startup_span):
+                service._start_refresh_loop(0.01, 30)
+            await asyncio.wait_for(refreshed.wait(), timeout=1)
+            await service.stop_scheduler()
+
+        assert service._scheduler is None
+        jitter.assert_called_with(0, 30)
+        assert parent_spans[0] is trace.INVALID_SPAN
 
     async def test_cache_stats_tracking(self):
         """Test cache statistics tracking"""